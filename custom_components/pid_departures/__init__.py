@@ -1,40 +1,134 @@
 """Prague Departure Board integration."""
 from __future__ import annotations
 
+from datetime import datetime
+import hashlib
+from typing import Any
+
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_API_KEY, CONF_ID
-from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.const import CONF_API_KEY, CONF_ID, EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant, callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.start import async_at_started
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.helpers.typing import ConfigType
+from homeassistant.util import dt
 
-from .const import DOMAIN, CONF_DEP_NUM, CONF_WALKING_OFFSET
-from .errors import CannotConnect, StopNotFound, WrongApiKey
-from .hub import DepartureBoard
+from .const import (
+    DOMAIN,
+    CONF_CAL_EVENTS_NUM,
+    CONF_DEP_NUM,
+    CONF_EXTRA_API_KEYS,
+    CONF_EXTRA_WALKING_OFFSETS,
+    CONF_GTFS_FEED,
+    CONF_WALKING_OFFSET,
+    DATA_GTFS,
+    DATA_INFOTEXTS,
+    DATA_KEY_POOL,
+    DATA_LOOP_MONITOR,
+    DATA_SEEDS,
+    DATA_WARMUP,
+    DEPARTURES_CACHE_TTL,
+    STOP_CATALOGUE_REFRESH,
+)
+from .catalogue import get_catalogue
+from .gtfs import GtfsTimetable
+from .history import remove_file
+from .hub import DepartureBoard, history_path
+from .infotexts import InfotextStore
+from .keypool import ApiKeyPool
+from .loopmonitor import LoopMonitor
+from .services import async_setup_services
+from .warmup import BoardWarmUp
 
 PLATFORMS: list[str] = ["sensor", "binary_sensor", "calendar"]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the services of the integration."""
+    async_setup_services(hass)
+
+    # Stalls of the event loop are measured for the System information page.
+    monitor = hass.data[DATA_LOOP_MONITOR] = LoopMonitor(hass)
+    monitor.start()
+
+    @callback
+    def async_stop_monitor(_: Event) -> None:
+        monitor.stop()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_monitor)
+
+    # The list of stops is refreshed in the background once Home Assistant has started, and then daily.
+    catalogue = get_catalogue(hass)
+
+    @callback
+    def async_refresh_catalogue(*_: object) -> None:
+        hass.async_create_background_task(
+            catalogue.async_refresh(hass.data[DATA_KEY_POOL]), f"{DOMAIN} stop catalogue refresh"
+        )
+
+    async_at_started(hass, async_refresh_catalogue)
+    async_track_time_interval(hass, async_refresh_catalogue, STOP_CATALOGUE_REFRESH)
+
+    # First data of boards set up together (e.g. after a restart) is fetched in batched requests.
+    warm_up = hass.data[DATA_WARMUP] = BoardWarmUp(hass, hass.data[DATA_KEY_POOL])
+
+    @callback
+    def async_cancel_warm_up(_: Event) -> None:
+        warm_up.cancel()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_cancel_warm_up)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Departure Board from a config entry flow."""
     walking_offset = entry.data.get(CONF_WALKING_OFFSET, 0)
+    # API keys of all entries are pooled, requests of each board are spread across all of them.
+    key_pool: ApiKeyPool = hass.data[DATA_KEY_POOL]
+    key_pool.register(entry.entry_id, [entry.data[CONF_API_KEY], *entry.data.get(CONF_EXTRA_API_KEYS, [])])
+    entry.async_on_unload(lambda: key_pool.unregister(entry.entry_id))
+
+    gtfs: GtfsTimetable | None = None
+    if feed := entry.data.get(CONF_GTFS_FEED):
+        gtfs = _get_timetable(hass, feed)
+        # Importing the feed takes a while, the board falls back to it once it is ready.
+        hass.async_create_background_task(
+            gtfs.async_ensure_stops([entry.data[CONF_ID]]), f"{DOMAIN} GTFS import {entry.entry_id}"
+        )
+
     hub = DepartureBoard(
         hass,
         entry.data[CONF_API_KEY],
         entry.data[CONF_ID],
         entry.data[CONF_DEP_NUM],
-        walking_offset
+        walking_offset,
+        entry.data.get(CONF_CAL_EVENTS_NUM, 0),
+        gtfs,
+        # Infotexts are mostly network-wide, boards using the same API key share them.
+        hass.data.setdefault(DATA_INFOTEXTS, {}).setdefault(entry.data[CONF_API_KEY], InfotextStore()),
+        key_pool,
+        # Views with other walking offsets are derived from the same request.
+        entry.data.get(CONF_EXTRA_WALKING_OFFSETS, []),
+        entry.title,
+        entry.entry_id,
     )  # type: ignore[Any]
-    try:
-        await hub.async_update()
-    except CannotConnect:
-        # try again later again
-        raise ConfigEntryNotReady from None
-    except StopNotFound:
-        return False
-    except WrongApiKey:
-        return False
+    await hub.async_load_history()
+
+    # Entities are created right away and stay unavailable until the first data of the board arrive.
+    if not await _async_seed(hass, hub, entry):
+        hass.data[DATA_WARMUP].add(hub)
 
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = hub  # type: ignore[Any]
 
+    async def async_save_history(_: Event) -> None:
+        await hub.async_save_history()
+
+    entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_save_history))
+
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     return True
 
@@ -46,6 +140,39 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # details
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)  # type: ignore[Any]
+        hub: DepartureBoard = hass.data[DOMAIN].pop(entry.entry_id)  # type: ignore[Any]
+        hub.triggers.cancel()
+        hass.data[DATA_WARMUP].discard(hub)
+        await hub.async_save_history()
+        if hub.gtfs and not any(board.gtfs is hub.gtfs for board in hass.data[DOMAIN].values()):  # type: ignore[Any]
+            hass.data[DATA_GTFS].pop(hub.gtfs.feed_path).close()
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove files of a removed config entry."""
+    await hass.async_add_executor_job(remove_file, history_path(hass, entry.entry_id))
+
+
+async def _async_seed(hass: HomeAssistant, hub: DepartureBoard, entry: ConfigEntry) -> bool:
+    """Use the reply of the config flow, if there is a recent one, as the first data of the board."""
+    seed: tuple[datetime, dict[str, Any]] | None = hass.data.get(DATA_SEEDS, {}).pop(entry.data[CONF_ID], None)
+    if seed is None:
+        return False
+    fetched, reply = seed
+    if dt.now() - fetched > DEPARTURES_CACHE_TTL or hub.walking_offset > min(hub.walking_offsets):
+        # The reply is stale, or it does not cover views of the board with earlier walking offsets.
+        return False
+    return await hub.async_seed(reply, truncated=len(reply["departures"]) >= entry.data[CONF_DEP_NUM])
+
+
+def _get_timetable(hass: HomeAssistant, feed: str) -> GtfsTimetable:
+    """Return the GTFS timetable of the feed, shared by all boards using it."""
+    feed_path = hass.config.path(feed)
+    timetables: dict[str, GtfsTimetable] = hass.data.setdefault(DATA_GTFS, {})
+    if feed_path not in timetables:
+        feed_hash = hashlib.sha1(feed_path.encode()).hexdigest()[:8]
+        index_path = hass.config.path(STORAGE_DIR, f"{DOMAIN}.gtfs.{feed_hash}")
+        timetables[feed_path] = GtfsTimetable(hass, feed_path, index_path)
+    return timetables[feed_path]
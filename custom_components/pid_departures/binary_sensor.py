@@ -38,7 +38,9 @@ class InfotextBinarySensor(BaseEntity, BinarySensorEntity):
 
     @property
     def extra_state_attributes(self) -> Mapping[str, Any]:
-        return self._departure_board.info_text[1]
+        """Returns the first info text and the list of all info texts affecting the stop."""
+        texts = self._departure_board.info_texts
+        return {**texts[0], "infotexts": texts} if texts else {}
 
     @property
     def icon(self) -> str:
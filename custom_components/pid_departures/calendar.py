@@ -1,10 +1,10 @@
 """Platform for calendar integration."""
 from __future__ import annotations
 
-from collections.abc import Mapping
+from collections.abc import Mapping, Sequence
 from datetime import datetime, timedelta
 import logging
-from typing import Any, cast
+from typing import Any
 from typing_extensions import override
 
 from homeassistant.components.calendar import CalendarEntity, CalendarEvent
@@ -12,10 +12,16 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.const import CONF_LATITUDE, CONF_LONGITUDE, STATE_ON
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.util import dt
 
-from .const import CAL_EVENT_MIN_DURATION_SEC, CONF_CAL_EVENTS_NUM, DOMAIN, ICON_STOP, ROUTE_TYPE_ICON, RouteType
-from .dep_board_api import PIDDepartureBoardAPI
+from .const import (
+    CAL_EVENT_MIN_DURATION_SEC,
+    CONF_CAL_EVENTS_NUM,
+    DOMAIN,
+    EVENTS_INLINE_MAX,
+    ICON_STOP,
+    ROUTE_TYPE_ICON,
+    RouteType,
+)
 from .entity import BaseEntity
 from .hub import DepartureBoard, DepartureData
 
@@ -60,7 +66,10 @@ class DeparturesCalendarEntity(BaseEntity, CalendarEntity):
     @override
     def event(self) -> CalendarEvent | None:
         """Return the current or next upcoming event."""
-        return self._create_event(self._departure_board.departures[0])
+        departures = self._departure_board.departures
+        if not departures:
+            return None
+        return create_event(departures[0], self._route_type_names(), self._departure_board.name)
 
     @property
     @override
@@ -77,8 +86,9 @@ class DeparturesCalendarEntity(BaseEntity, CalendarEntity):
     def extra_state_attributes(self) -> Mapping[str, Any]:
         # NOTE: When CONF_LATITUDE and CONF_LONGITUDE is included, HASS shows
         #  the entity on the map.
+        departures = self._departure_board.departures
         return {
-            **self._departure_board.departures[0].as_dict(),
+            **(departures[0].as_dict() if departures else {}),
             CONF_LATITUDE: self._departure_board.latitude,
             CONF_LONGITUDE: self._departure_board.longitude,
         }
@@ -89,52 +99,21 @@ class DeparturesCalendarEntity(BaseEntity, CalendarEntity):
     ) -> list[CalendarEvent]:
         if self._events_count == 0:
             return []
-        time_before = dt.now() - start_date
-        time_after = end_date - dt.now()
-
-        if (not timedelta_in_range(time_before, *PIDDepartureBoardAPI.TIME_BEFORE_RANGE) and
-            not timedelta_in_range(time_after, *PIDDepartureBoardAPI.TIME_AFTER_RANGE)):
-            _LOGGER.debug(f"async_get_events: start_date={start_date} end_date={end_date} is out of range")
-            return []
-
-        data = await PIDDepartureBoardAPI.async_fetch_data(
-            self._departure_board.api_key,
-            self._departure_board.board_id,
-            limit=self._events_count,
-            time_before=timedelta_clamp(time_before, *PIDDepartureBoardAPI.TIME_BEFORE_RANGE),
-            time_after=timedelta_clamp(time_after, *PIDDepartureBoardAPI.TIME_AFTER_RANGE))
-
-        events = (
-            self._create_event(DepartureData.from_api(dep))
-            for dep in cast(list[dict[str, Any]], data["departures"])
-        )
-        return [event for event in events if event]
-
-    def _create_event(self, departure: DepartureData) -> CalendarEvent | None:
-        start = departure.arrival_time_est
-        end = departure.departure_time_est
-
-        if not start and not end:
-            _LOGGER.error('Invalid data, both "arrival_timestamp" and "departure_timestamp" is null')
-            return None
-        elif start:
-            # departure_timestamp is null on last stops.
-            if not end or (end - start).seconds < CAL_EVENT_MIN_DURATION_SEC:
-                end = start + timedelta(seconds=CAL_EVENT_MIN_DURATION_SEC)
-        elif end:
-            # arrival_timestamp is null on first stops.
-            start = end - timedelta(seconds=CAL_EVENT_MIN_DURATION_SEC)
-
-        route_type = self._translate(f"state_attributes.route_type.state.{departure.route_type}")
-        short_name = departure.route_name or "?"
-
-        return CalendarEvent(
-            start=start,
-            end=end,
-            summary=f"{route_type} {short_name}",
-            location=self._departure_board.name,
-            description=f"Trip to {departure.trip_headsign}",
+        departures = await self._departure_board.async_get_departures_between(
+            start_date, end_date, limit=self._events_count
         )
+        # Translations and the location are read in the event loop, events are built from plain values.
+        route_type_names, location = self._route_type_names(), self._departure_board.name
+        if len(departures) > EVENTS_INLINE_MAX:
+            # Departures are materialized lazily, so both that and building the events is done in the executor.
+            return await hass.async_add_executor_job(create_events, departures, route_type_names, location)
+        return create_events(departures, route_type_names, location)
+
+    def _route_type_names(self) -> dict[RouteType, str]:
+        """Return translated names of route types."""
+        return {
+            route_type: self._translate(f"state_attributes.route_type.state.{route_type}") for route_type in RouteType
+        }
 
     def _translate(self, key_path: str) -> str:
         """Translate the given key path."""
@@ -147,14 +126,39 @@ class DeparturesCalendarEntity(BaseEntity, CalendarEntity):
             return self.platform.platform_translations.get(key, key_path)
 
 
-def timedelta_clamp(delta: timedelta, min: timedelta, max: timedelta) -> timedelta:
-    if delta < min:
-        return min
-    elif delta > max:
-        return max
-    else:
-        return delta
-
-
-def timedelta_in_range(delta: timedelta, min: timedelta, max: timedelta) -> bool:
-    return min <= delta <= max
+def create_events(
+    departures: Sequence[DepartureData], route_type_names: Mapping[RouteType, str], location: str
+) -> list[CalendarEvent]:
+    """Create calendar events of the departures (may run in an executor)."""
+    events = (create_event(dep, route_type_names, location) for dep in departures)
+    return [event for event in events if event]
+
+
+def create_event(
+    departure: DepartureData, route_type_names: Mapping[RouteType, str], location: str
+) -> CalendarEvent | None:
+    """Create a calendar event of the departure."""
+    start = departure.arrival_time_est
+    end = departure.departure_time_est
+
+    if not start and not end:
+        _LOGGER.error('Invalid data, both "arrival_timestamp" and "departure_timestamp" is null')
+        return None
+    elif start:
+        # departure_timestamp is null on last stops.
+        if not end or (end - start).seconds < CAL_EVENT_MIN_DURATION_SEC:
+            end = start + timedelta(seconds=CAL_EVENT_MIN_DURATION_SEC)
+    elif end:
+        # arrival_timestamp is null on first stops.
+        start = end - timedelta(seconds=CAL_EVENT_MIN_DURATION_SEC)
+
+    route_type = route_type_names.get(departure.route_type, str(departure.route_type))
+    short_name = departure.route_name or "?"
+
+    return CalendarEvent(
+        start=start,
+        end=end,
+        summary=f"{route_type} {short_name}",
+        location=location,
+        description=f"Trip to {departure.trip_headsign}",
+    )
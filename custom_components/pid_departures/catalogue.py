@@ -0,0 +1,188 @@
+"""Catalogue of stops: the bundled stop list updated by a delta refreshed from the API."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+import importlib
+import logging
+from typing import Any
+import zlib
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt
+
+from .const import DATA_STOP_CATALOGUE, DOMAIN, STOP_CATALOGUE_MAX_REMOVED, STOP_CATALOGUE_REFRESH
+from .dep_board_api import PIDDepartureBoardAPI
+from .errors import CannotConnect, StopNotFound, StopNotInList, WrongApiKey
+from .keypool import ApiKeyPool
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = f"{DOMAIN}.stops"
+STORAGE_VERSION = 1
+
+
+def get_catalogue(hass: HomeAssistant) -> StopCatalogue:
+    """Return the catalogue of stops shared by the config flow and services."""
+    if DATA_STOP_CATALOGUE not in hass.data:
+        hass.data[DATA_STOP_CATALOGUE] = StopCatalogue(hass)
+    return hass.data[DATA_STOP_CATALOGUE]  # type: ignore[Any]
+
+
+class StopCatalogue:
+    """Stops (ASW ID to name with platform) which can be selected for departure boards.
+
+    The stop list bundled with the integration is a baseline. A refresh fetches the current GTFS stops
+    from the API and stores only their difference to the baseline (changed and removed stops) on disk,
+    with a revision number and the fingerprint of the baseline it applies to. Both are loaded lazily,
+    when the stops are needed for the first time.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._lock = asyncio.Lock()
+        self._delta: dict[str, Any] | None = None
+        self._delta_loaded = False
+        self._stops: dict[str, str] | None = None
+        self._by_name: dict[str, str] = {}
+
+    @property
+    def revision(self) -> int:
+        """Revision of the delta, 0 if there is none."""
+        return self._delta["revision"] if self._delta else 0
+
+    async def _async_load_delta(self) -> dict[str, Any] | None:
+        if not self._delta_loaded:
+            self._delta = await self._store.async_load()
+            self._delta_loaded = True
+        return self._delta
+
+    async def _async_ensure_loaded(self) -> dict[str, str]:
+        async with self._lock:
+            if self._stops is None:
+                delta = await self._async_load_delta()
+                self._set_stops(await self._hass.async_add_executor_job(merge_delta, delta))
+            assert self._stops is not None
+            return self._stops
+
+    def _set_stops(self, stops: dict[str, str]) -> None:
+        self._stops = stops
+        self._by_name = {}
+        for asw_id, name in stops.items():
+            # Stops with the same name are resolved to the first of them, like in the bundled list.
+            self._by_name.setdefault(name, asw_id)
+
+    async def async_names(self) -> list[str]:
+        """Return names of all stops."""
+        return list((await self._async_ensure_loaded()).values())
+
+    async def async_resolve(self, stop: str) -> str:
+        """Return ASW ID of a stop given by its ASW ID or by its name."""
+        stops = await self._async_ensure_loaded()
+        if stop in stops:
+            return stop
+        try:
+            return self._by_name[stop]
+        except KeyError:
+            raise StopNotInList(f"Stop {stop} was not found in the list of stops") from None
+
+    async def async_refresh(self, key_pool: ApiKeyPool, now: datetime | None = None, force: bool = False) -> None:
+        """Refresh the delta from the API, unless it was refreshed recently."""
+        now = now or dt.now()
+        delta = await self._async_load_delta()
+        if not force and delta and now - datetime.fromisoformat(delta["updated"]) < STOP_CATALOGUE_REFRESH:
+            return
+        if not key_pool.keys:
+            return
+
+        features: list[dict[str, Any]] = []
+        limit = PIDDepartureBoardAPI.STOPS_MAX_LIMIT
+        try:
+            while True:
+                page = await key_pool.async_fetch_stops(limit, len(features))
+                features.extend(page.get("features") or [])
+                if len(page.get("features") or []) < limit:
+                    break
+        except (CannotConnect, StopNotFound, WrongApiKey) as err:
+            _LOGGER.warning(f"Failed to refresh the list of stops: {err!r}")
+            return
+
+        new_delta = await self._hass.async_add_executor_job(build_delta, features)
+        if new_delta is None:
+            _LOGGER.warning(f"Ignoring incomplete list of {len(features)} stops received from API")
+            return
+        unchanged = delta is not None and all(
+            delta.get(key) == new_delta[key] for key in ("baseline", "changed", "removed")
+        )
+        new_delta["revision"] = self.revision if unchanged else self.revision + 1
+        new_delta["updated"] = now.isoformat()
+        await self._store.async_save(new_delta)
+        self._delta = new_delta
+        if unchanged:
+            return
+
+        _LOGGER.info(
+            f"List of stops updated to revision {new_delta['revision']}: "
+            f"{len(new_delta['changed'])} new or renamed, {len(new_delta['removed'])} removed"
+        )
+        async with self._lock:
+            if self._stops is not None:
+                self._set_stops(await self._hass.async_add_executor_job(merge_delta, new_delta))
+
+
+def load_baseline() -> tuple[dict[str, str], int]:
+    """Return stops of the bundled stop list and its fingerprint."""
+    # The stop list is a large module, it is imported only when needed.
+    stop_list = importlib.import_module(".stop_list", __package__)
+    stops = dict(zip(stop_list.ASW_IDS, stop_list.STOP_LIST))
+    fingerprint = zlib.crc32("\n".join(f"{asw_id}\t{name}" for asw_id, name in stops.items()).encode())
+    return stops, fingerprint
+
+
+def merge_delta(delta: dict[str, Any] | None) -> dict[str, str]:
+    """Return stops of the bundled stop list updated by the delta."""
+    stops, fingerprint = load_baseline()
+    if delta is None or delta.get("baseline") != fingerprint:
+        # The delta was made for a stop list bundled with another version of the integration.
+        return stops
+    for asw_id in delta["removed"]:
+        stops.pop(asw_id, None)
+    stops.update(delta["changed"])
+    return stops
+
+
+def build_delta(features: list[dict[str, Any]]) -> dict[str, Any] | None:
+    """Return the difference between GTFS stops (GeoJSON features) and the bundled stop list, None if the
+    stops seem incomplete."""
+    baseline, fingerprint = load_baseline()
+    current: dict[str, str] = {}
+    for feature in features:
+        props = feature.get("properties") or {}
+        if (asw_id := parse_asw_id(props.get("asw_id"))) is None or props.get("location_type", 0) != 0:
+            continue
+        current.setdefault(asw_id, stop_label(props["stop_name"], props.get("platform_code")))
+
+    removed = [asw_id for asw_id in baseline if asw_id not in current]
+    if len(removed) > STOP_CATALOGUE_MAX_REMOVED * len(baseline):
+        return None
+    return {
+        "baseline": fingerprint,
+        "changed": {asw_id: name for asw_id, name in current.items() if baseline.get(asw_id) != name},
+        "removed": removed,
+    }
+
+
+def parse_asw_id(value: Any) -> str | None:
+    """Return ASW ID in the form used by the integration (node_stop)."""
+    if isinstance(value, dict) and value.get("node") is not None and value.get("stop") is not None:
+        return f"{value['node']}_{value['stop']}"
+    if isinstance(value, str) and value:
+        return value.replace("/", "_")
+    return None
+
+
+def stop_label(name: str, platform: str | None) -> str:
+    """Return the name of the stop as shown in the list of stops."""
+    return f"{name} {platform}" if platform else name
@@ -0,0 +1,327 @@
+"""Compact columnar (struct-of-arrays) storage of departures."""
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from datetime import datetime
+import sys
+from typing import TYPE_CHECKING, Any, overload
+from zoneinfo import ZoneInfo
+
+from attrs import fields
+
+from .const import RouteType
+from .dep_board_api import split_by_stop
+
+if TYPE_CHECKING:
+    # The hub stores its departures here, so DepartureData is imported where needed to avoid an import cycle.
+    from .hub import DepartureData
+
+TIMEZONE = ZoneInfo("Europe/Prague")
+
+TIME_FIELDS = ("arrival_time_est", "arrival_time_sched", "departure_time_est", "departure_time_sched")
+INT_FIELDS = ("delay_min", "delay_sec")
+FLAG_FIELDS = (
+    "is_delay_avail",
+    "is_air_conditioned",
+    "is_at_stop",
+    "is_canceled",
+    "is_night",
+    "is_regional",
+    "is_substitute",
+    "is_wheelchair_accessible",
+)
+STRING_FIELDS = (
+    "departure_in_min",
+    "route_name",
+    "route_type",
+    "train_number",
+    "trip_id",
+    "trip_direction",
+    "trip_headsign",
+    "last_stop_id",
+    "last_stop_name",
+    "stop_id",
+    "stop_platform",
+)
+
+# Sentinels of missing values in integer columns.
+NO_TIME = -(2 ** 63)
+NO_INT = -(2 ** 31)
+
+
+class DepartureColumns(Sequence["DepartureData"]):
+    """Departures stored in parallel arrays instead of a list of DepartureData objects.
+
+    Times are stored as epoch seconds, flags are bit-packed into a byte per departure, and strings are kept
+    once per store in a table (and interned, so they are shared between stores) with columns holding indexes
+    into it. DepartureData objects are materialized lazily only for departures which are read.
+    """
+
+    def __init__(self) -> None:
+        self._times = {name: array("q") for name in TIME_FIELDS}
+        self._ints = {name: array("i") for name in INT_FIELDS}
+        self._strings = {name: array("I") for name in STRING_FIELDS}
+        self._flags = array("B")
+        self._table: list[str | None] = [None]
+        self._lookup: dict[str, int] = {}
+        self._cache: dict[int, DepartureData] = {}
+
+    @classmethod
+    def from_api(cls, departures: Iterable[dict[str, Any]]) -> DepartureColumns:
+        """Create the store from departures in the PID Departure Board API response."""
+        from .hub import DepartureData, dig, parse_route_type
+
+        store = cls()
+        paths = [(f.name, f.metadata["src"].split(".")) for f in fields(DepartureData)]  # type: ignore[Any]
+        # Predicted and scheduled times are mostly the same, each distinct timestamp is parsed only once.
+        epochs: dict[str, int] = {}
+        for dep in departures:
+            values = {name: dig(dep, path) for name, path in paths}  # type: ignore[Any]
+            values["route_type"] = parse_route_type(values["route_type"])
+            for name in TIME_FIELDS:
+                if isinstance(time := values[name], str):
+                    if (epoch := epochs.get(time)) is None:
+                        epoch = epochs[time] = int(datetime.fromisoformat(time).timestamp())
+                    values[name] = epoch
+            store._append(values)
+        return store
+
+    @classmethod
+    def from_departures(cls, departures: Iterable[DepartureData]) -> DepartureColumns:
+        """Create the store from DepartureData objects."""
+        store = cls()
+        for dep in departures:
+            store._append(dep.as_dict())
+        return store
+
+    @classmethod
+    def gather(cls, rows: Iterable[tuple[DepartureColumns, int]]) -> DepartureColumns:
+        """Create the store from rows of other stores (given by the store and the index of the row)."""
+        store = cls()
+        for source, idx in rows:
+            store._append_row(source, idx)
+        return store
+
+    @classmethod
+    def concat(cls, parts: Iterable[tuple[DepartureColumns, int, int]]) -> DepartureColumns:
+        """Create the store from ranges of rows of other stores (given by the store and the start and stop index
+        of the range), copying slices of the columns instead of single rows."""
+        store = cls()
+        parts = [(source, start, stop) for source, start, stop in parts if start < stop]
+        if not parts:
+            return store
+        used: dict[DepartureColumns, set[int]] = {}
+        for source, start, stop in parts:
+            strings = used.setdefault(source, set())
+            for column in source._strings.values():
+                strings.update(column[start:stop])
+        # The string table of the largest source is taken over, unless most of it is left from dropped rows.
+        # Strings of other sources are interned and their columns translated.
+        largest = max(parts, key=lambda part: part[2] - part[1])[0]
+        shared = largest if len(largest._table) <= 2 * len(used[largest]) + 1 else None
+        if shared is not None:
+            store._table, store._lookup = list(shared._table), dict(shared._lookup)
+        remaps: dict[DepartureColumns, array[int]] = {}
+        for source, start, stop in parts:
+            for name, column in store._times.items():
+                column.extend(source._times[name][start:stop])
+            for name, column in store._ints.items():
+                column.extend(source._ints[name][start:stop])
+            if source is shared:
+                for name, column in store._strings.items():
+                    column.extend(source._strings[name][start:stop])
+            else:
+                if (remap := remaps.get(source)) is None:
+                    remap = remaps[source] = array("I", [0]) * len(source._table)
+                    for idx in used[source]:
+                        remap[idx] = store._intern(source._table[idx])
+                for name, column in store._strings.items():
+                    column.extend(map(remap.__getitem__, source._strings[name][start:stop]))
+            store._flags.extend(source._flags[start:stop])
+        return store
+
+    def _intern(self, value: Any) -> int:
+        if value is None:
+            return 0
+        value = str(value)
+        if (idx := self._lookup.get(value)) is None:
+            idx = self._lookup[value] = len(self._table)
+            self._table.append(sys.intern(value))
+        return idx
+
+    def _append(self, values: Mapping[str, Any]) -> None:
+        for name, column in self._times.items():
+            time = values[name]
+            if isinstance(time, datetime):
+                time = int(time.timestamp())
+            column.append(NO_TIME if time is None else time)
+        for name, column in self._ints.items():
+            column.append(NO_INT if values[name] is None else values[name])
+        intern = self._intern
+        for name, column in self._strings.items():
+            column.append(intern(values[name]))
+        flags = 0
+        for bit, name in enumerate(FLAG_FIELDS):
+            if values[name]:
+                flags |= 1 << bit
+        self._flags.append(flags)
+
+    def _append_row(self, source: DepartureColumns, idx: int) -> None:
+        for name, column in self._times.items():
+            column.append(source._times[name][idx])
+        for name, column in self._ints.items():
+            column.append(source._ints[name][idx])
+        for name, column in self._strings.items():
+            column.append(self._intern(source._table[source._strings[name][idx]]))
+        self._flags.append(source._flags[idx])
+
+    def __len__(self) -> int:
+        return len(self._flags)
+
+    @overload
+    def __getitem__(self, idx: int) -> DepartureData: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> DepartureSlice: ...
+
+    def __getitem__(self, idx: int | slice) -> DepartureData | DepartureSlice:
+        if isinstance(idx, slice):
+            return DepartureSlice(self, range(len(self))[idx])
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("departure index out of range")
+        if (departure := self._cache.get(idx)) is None:
+            departure = self._cache[idx] = self._materialize(idx)
+        return departure
+
+    def __iter__(self) -> Iterator[DepartureData]:
+        return (self[i] for i in range(len(self)))
+
+    def _materialize(self, idx: int) -> DepartureData:
+        from .hub import DepartureData
+
+        values: dict[str, Any] = {}
+        for name, column in self._times.items():
+            values[name] = None if column[idx] == NO_TIME else datetime.fromtimestamp(column[idx], TIMEZONE)
+        for name, column in self._ints.items():
+            values[name] = None if column[idx] == NO_INT else column[idx]
+        for name, column in self._strings.items():
+            values[name] = self._table[column[idx]]
+        values["route_type"] = RouteType(values["route_type"])
+        flags = self._flags[idx]
+        for bit, name in enumerate(FLAG_FIELDS):
+            values[name] = bool(flags & (1 << bit))
+        return DepartureData(**values)
+
+    def epoch(self, idx: int, name: str) -> int | None:
+        """Return the time field of the departure as epoch second, without materializing it."""
+        time = self._times[name][idx]
+        return None if time == NO_TIME else time
+
+    def text(self, idx: int, name: str) -> str | None:
+        """Return the string field of the departure, without materializing it."""
+        return self._table[self._strings[name][idx]]
+
+    def flag(self, idx: int, name: str) -> bool:
+        """Return the boolean field of the departure, without materializing it."""
+        return bool(self._flags[idx] & (1 << FLAG_FIELDS.index(name)))
+
+    def instant(self, idx: int) -> int | None:
+        """Return the epoch second the departure is indexed by (estimated departure, or arrival on last stops)."""
+        for name in ("departure_time_est", "arrival_time_est"):
+            if (time := self._times[name][idx]) != NO_TIME:
+                return time
+        return None
+
+    def key(self, idx: int) -> tuple[str | None, int]:
+        """Return a key identifying the same departure across API responses."""
+        scheduled = self._times["departure_time_sched"][idx]
+        if scheduled == NO_TIME:
+            scheduled = self._times["arrival_time_sched"][idx]
+        return self._table[self._strings["trip_id"][idx]], scheduled
+
+    def find(self, keys: set[tuple[str | None, int]], rows: Iterable[int]) -> list[int]:
+        """Return the rows, of the given ones, whose key (see key) is one of the keys."""
+        trip_ids = self._strings["trip_id"]
+        # Trip IDs are compared as indexes into the string table first, keys are built only for matching rows.
+        wanted = {0 if trip_id is None else self._lookup.get(trip_id, -1) for trip_id, _ in keys}
+        return [idx for idx in rows if trip_ids[idx] in wanted and self.key(idx) in keys]
+
+    def delay_records(self) -> Iterator[tuple[str, str, int, int, bool]]:
+        """Yield (trip ID, route, scheduled epoch second, delay, is canceled) of departures with known delay,
+        or canceled, without materializing them."""
+        is_delay_avail, is_canceled = 1 << FLAG_FIELDS.index("is_delay_avail"), 1 << FLAG_FIELDS.index("is_canceled")
+        for idx, flags in enumerate(self._flags):
+            trip_id, scheduled = self.key(idx)
+            if trip_id is None or scheduled == NO_TIME:
+                continue
+            route = self._table[self._strings["route_name"][idx]] or "?"
+            if flags & is_canceled:
+                yield trip_id, route, scheduled, 0, True
+            elif flags & is_delay_avail and (delay := self._ints["delay_sec"][idx]) != NO_INT:
+                yield trip_id, route, scheduled, delay, False
+
+
+class DepartureSlice(Sequence["DepartureData"]):
+    """Lazy slice of the departures in a store, departures are materialized when read."""
+
+    def __init__(self, store: DepartureColumns, rows: range) -> None:
+        self._store = store
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @overload
+    def __getitem__(self, idx: int) -> DepartureData: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> DepartureSlice: ...
+
+    def __getitem__(self, idx: int | slice) -> DepartureData | DepartureSlice:
+        if isinstance(idx, slice):
+            return DepartureSlice(self._store, self._rows[idx])
+        return self._store[self._rows[idx]]
+
+
+class DepartureChain(Sequence["DepartureData"]):
+    """Lazy concatenation of sequences of departures, departures are materialized when read."""
+
+    def __init__(self, *parts: Sequence[DepartureData]) -> None:
+        self._parts = [part for part in parts if part]
+
+    def __len__(self) -> int:
+        return sum(len(part) for part in self._parts)
+
+    @overload
+    def __getitem__(self, idx: int) -> DepartureData: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> list[DepartureData]: ...
+
+    def __getitem__(self, idx: int | slice) -> DepartureData | list[DepartureData]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        for part in self._parts:
+            if 0 <= idx < len(part):
+                return part[idx]
+            idx -= len(part)
+        raise IndexError("departure index out of range")
+
+
+def decode_departures(data: dict[str, Any]) -> dict[str, Any]:
+    """Replace departures in the API response with a DepartureColumns store."""
+    data["departures"] = DepartureColumns.from_api(data["departures"])
+    return data
+
+
+def decode_parts(data: dict[str, Any]) -> dict[str, Any]:
+    """Split a response for multiple stops by stop and decode departures of each of them."""
+    parts = split_by_stop(data)
+    for part in parts.values():
+        decode_departures(part)
+    return {"count": len(data["departures"]), "parts": parts}
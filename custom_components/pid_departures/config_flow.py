@@ -1,4 +1,6 @@
 import logging
+import os
+import re
 from typing import Any, cast
 from datetime import timedelta
 
@@ -6,13 +8,33 @@ from homeassistant.const import CONF_API_KEY, CONF_ID
 from homeassistant import config_entries
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.selector import selector
+from homeassistant.util import dt
 import voluptuous as vol
 
-from .const import CONF_CAL_EVENTS_NUM, CONF_DEP_NUM, CONF_STOP_SEL, CONF_WALKING_OFFSET, DOMAIN
+from .const import (
+    CONF_BOARD_SENSOR,
+    CONF_CAL_EVENTS_NUM,
+    CONF_DEP_NUM,
+    CONF_EXTRA_API_KEYS,
+    CONF_EXTRA_WALKING_OFFSETS,
+    CONF_GTFS_FEED,
+    CONF_STOP_SEL,
+    CONF_WALKING_OFFSET,
+    DATA_SEEDS,
+    DOMAIN,
+)
+from .catalogue import get_catalogue
 from .dep_board_api import PIDDepartureBoardAPI
-from .errors import CannotConnect, NoDeparturesSelected, StopNotFound, StopNotInList, WrongApiKey
+from .errors import (
+    CannotConnect,
+    GtfsFeedNotFound,
+    InvalidWalkingOffsets,
+    NoDeparturesSelected,
+    StopNotFound,
+    StopNotInList,
+    WrongApiKey,
+)
 from .hub import DepartureBoard
-from .stop_list import STOP_LIST, ASW_IDS
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,10 +44,29 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> tuple[dic
     Data has the keys from DATA_SCHEMA with values provided by the user.
     """
     try:
-        data[CONF_ID] = ASW_IDS[STOP_LIST.index(data[CONF_STOP_SEL])]  # type: ignore[Any]
+        data[CONF_ID] = await get_catalogue(hass).async_resolve(data[CONF_STOP_SEL])
     except Exception:
         raise StopNotInList
 
+    # Additional API keys are entered separated by commas or whitespace.
+    extra_keys: str = data.get(CONF_EXTRA_API_KEYS, "")
+    data[CONF_EXTRA_API_KEYS] = [key for key in re.split(r"[\s,]+", extra_keys) if key]
+
+    # Additional walking offsets (minutes) are entered the same way.
+    extra_offsets: str = data.get(CONF_EXTRA_WALKING_OFFSETS, "")
+    try:
+        offsets = [int(offset) for offset in re.split(r"[\s,]+", extra_offsets) if offset]
+    except ValueError:
+        raise InvalidWalkingOffsets from None
+    if any(not -30 <= offset <= 4320 for offset in offsets):
+        raise InvalidWalkingOffsets
+    data[CONF_EXTRA_WALKING_OFFSETS] = offsets
+
+    if (feed := data.get(CONF_GTFS_FEED)) and not await hass.async_add_executor_job(
+        os.path.isfile, hass.config.path(feed)
+    ):
+        raise GtfsFeedNotFound
+
     # Get walking offset in minutes (user input) and convert to API format
     user_offset_minutes = data.get(CONF_WALKING_OFFSET, 0)
     # Convert user-friendly format to API format:
@@ -46,6 +87,8 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> tuple[dic
     if data[CONF_DEP_NUM] == 0:
         raise NoDeparturesSelected()
     else:
+        # The reply is handed over to the board created for the entry as its first data.
+        hass.data.setdefault(DATA_SEEDS, {})[data[CONF_ID]] = (dt.now(), reply)
         return {"title": title}, data
 
 
@@ -67,7 +110,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Required(CONF_DEP_NUM, default=1): int,
             CONF_STOP_SEL: selector({
                 "select": {
-                    "options": STOP_LIST,
+                    "options": await get_catalogue(self.hass).async_names(),
                     "mode": "dropdown",
                     "sort": True,
                     "custom_value": True
@@ -81,6 +124,10 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Coerce(int),
                 vol.Range(-30, 4320),
             ),
+            vol.Optional(CONF_EXTRA_WALKING_OFFSETS, default=""): str,
+            vol.Optional(CONF_EXTRA_API_KEYS, default=""): str,
+            vol.Optional(CONF_BOARD_SENSOR, default=False): bool,
+            vol.Optional(CONF_GTFS_FEED, default=""): str,
         }
 
         # Set dict for errors
@@ -107,6 +154,12 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             except StopNotInList:
                 errors[CONF_STOP_SEL] = "stop_not_in_list"
 
+            except GtfsFeedNotFound:
+                errors[CONF_GTFS_FEED] = "gtfs_feed_not_found"
+
+            except InvalidWalkingOffsets:
+                errors[CONF_EXTRA_WALKING_OFFSETS] = "invalid_walking_offsets"
+
             except NoDeparturesSelected:
                 errors[CONF_DEP_NUM] = "no_departures_selected"
 
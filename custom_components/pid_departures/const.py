@@ -2,6 +2,7 @@
 Defining constants for the project.
 """
 from aiohttp import ClientTimeout
+from datetime import timedelta
 from enum import StrEnum, auto
 from typing import Final
 
@@ -18,6 +19,8 @@ class RouteType(StrEnum):
 
 
 API_URL = "https://api.golemio.cz/v2/pid/departureboards"
+STOPS_URL = "https://api.golemio.cz/v2/gtfs/stops"
+TRIPS_URL = "https://api.golemio.cz/v2/gtfs/trips"
 HTTP_TIMEOUT: Final = ClientTimeout(total=10)
 
 ICON_STOP = "mdi:bus-stop-uncovered"
@@ -29,11 +32,40 @@ ICON_ZONE = "mdi:map-clock"
 ICON_INFO_ON = "mdi:alert-outline"
 ICON_INFO_OFF = "mdi:check-circle-outline"
 ICON_UPDATE = "mdi:update"
+ICON_PUNCTUALITY = "mdi:clock-check-outline"
+ICON_DELAY = "mdi:clock-alert-outline"
 DOMAIN = "pid_departures"
 CONF_CAL_EVENTS_NUM = "cal_events_number"
 CONF_DEP_NUM = "departures_number"
 CONF_STOP_SEL = "stop_selector"
 CONF_WALKING_OFFSET = "walking_offset"
+CONF_GTFS_FEED = "gtfs_feed"
+CONF_BOARD_SENSOR = "board_sensor"
+CONF_EXTRA_API_KEYS = "extra_api_keys"
+CONF_EXTRA_WALKING_OFFSETS = "extra_walking_offsets"
+
+DATA_GTFS = f"{DOMAIN}_gtfs"
+DATA_INFOTEXTS = f"{DOMAIN}_infotexts"
+DATA_TRIPS = f"{DOMAIN}_trips"
+DATA_KEY_POOL = f"{DOMAIN}_key_pool"
+DATA_LOOP_MONITOR = f"{DOMAIN}_loop_monitor"
+DATA_STOP_CATALOGUE = f"{DOMAIN}_stop_catalogue"
+DATA_TRIGGER_LEADS = f"{DOMAIN}_trigger_leads"
+DATA_SEEDS = f"{DOMAIN}_seeds"
+DATA_WARMUP = f"{DOMAIN}_warmup"
+
+EVENT_TRIP = f"{DOMAIN}_trip"
+EVENT_DEPARTURE = f"{DOMAIN}_departure"
+
+SERVICE_GET_DEPARTURES = "get_departures"
+SERVICE_TRACK_TRIP = "track_trip"
+SERVICE_UNTRACK_TRIP = "untrack_trip"
+ATTR_TRIP_ID = "trip_id"
+ATTR_STOPS = "stops"
+ATTR_LIMIT = "limit"
+ATTR_OFFSET = "offset"
+ATTR_ROUTE_NAMES = "route_names"
+ATTR_ROUTE_TYPES = "route_types"
 
 ROUTE_TYPE_ICON: Final = {
     RouteType.TRAM: "mdi:tram",
@@ -46,3 +78,70 @@ ROUTE_TYPE_ICON: Final = {
 }
 
 CAL_EVENT_MIN_DURATION_SEC = 15
+
+# Calendar timeline is fully refetched over the whole API range once in TIMELINE_FULL_REFRESH,
+# in between only its near-term part (affected by realtime delays) is refreshed.
+TIMELINE_FULL_REFRESH: Final = timedelta(hours=1)
+TIMELINE_NEAR_REFRESH: Final = timedelta(minutes=5)
+TIMELINE_NEAR_WINDOW: Final = timedelta(hours=1)
+
+# Delay history keeps the last HISTORY_CAPACITY observed departures of a board, departures delayed
+# less than HISTORY_ON_TIME_SEC are considered on time.
+HISTORY_CAPACITY: Final = 4096
+HISTORY_ON_TIME_SEC: Final = 180
+HISTORY_SAVE_INTERVAL: Final = timedelta(minutes=15)
+
+# Tracked trips are polled every TRIP_TRACKING_INTERVAL until they pass the target stop, or are dropped after
+# TRIP_TRACKING_TIMEOUT. Departures are requested up to TRIP_TRACKING_WINDOW ahead until the trip is seen at the
+# target stop, then only up to its departure from there plus TRIP_TRACKING_MARGIN. A trip seen at the target stop is
+# reported as passed once it is missing from TRIP_TRACKING_MISSES responses in a row, or its departure is past.
+TRIP_TRACKING_INTERVAL: Final = timedelta(seconds=30)
+TRIP_TRACKING_TIMEOUT: Final = timedelta(hours=3)
+TRIP_TRACKING_WINDOW: Final = timedelta(hours=2)
+TRIP_TRACKING_MARGIN: Final = timedelta(minutes=2)
+TRIP_TRACKING_MISSES: Final = 2
+# Stops of trips tracked without listing them are the last TRIP_TRACKING_MAX_STOPS stops up to the target stop.
+TRIP_TRACKING_MAX_STOPS: Final = 5
+
+# Boards with several walking offsets request the departures needed to fill all their views plus the number of
+# departures of a view as headroom. The limit shrinks only after FETCH_LIMIT_SHRINK_UPDATES updates in a row needed less.
+FETCH_LIMIT_SHRINK_UPDATES: Final = 10
+
+# Departures of a board updated less than DEPARTURES_CACHE_TTL ago are used to answer the get_departures service.
+DEPARTURES_CACHE_TTL: Final = timedelta(seconds=90)
+
+# The board sensor lists at most BOARD_SENSOR_MAX_DEPARTURES departures in its attributes.
+BOARD_SENSOR_MAX_DEPARTURES: Final = 20
+
+# Requests are spread across API keys by their remaining budget. Until the API reports it, the budget is
+# estimated as KEY_RATE_LIMIT requests per KEY_RATE_WINDOW. Keys rejected by the API are not used for a while.
+KEY_RATE_LIMIT: Final = 20
+KEY_RATE_WINDOW: Final = timedelta(seconds=8)
+KEY_EVICT_RATE_LIMITED: Final = timedelta(minutes=1)
+KEY_EVICT_WRONG: Final = timedelta(hours=1)
+
+# Responses larger than PARSE_INLINE_MAX_BYTES and calendar queries of more than EVENTS_INLINE_MAX events are
+# processed in an executor, smaller ones directly in the event loop, where the executor overhead would prevail.
+# The event loop is sampled every LOOP_MONITOR_INTERVAL, a sample delayed by LOOP_STALL_THRESHOLD or more is a stall.
+PARSE_INLINE_MAX_BYTES: Final = 64 * 1024
+EVENTS_INLINE_MAX: Final = 100
+LOOP_MONITOR_INTERVAL: Final = timedelta(seconds=1)
+LOOP_STALL_THRESHOLD: Final = timedelta(milliseconds=50)
+
+# The catalogue of stops is refreshed from the API every STOP_CATALOGUE_REFRESH. A refresh which would drop
+# more than STOP_CATALOGUE_MAX_REMOVED of the bundled stops is considered incomplete and ignored.
+STOP_CATALOGUE_REFRESH: Final = timedelta(days=1)
+STOP_CATALOGUE_MAX_REMOVED: Final = 0.2
+
+# Departure triggers are re-armed only when the estimated departure moves by more than DEPARTURE_TRIGGER_THRESHOLD.
+# Triggers can be set up to DEPARTURE_TRIGGER_MAX_MINUTES before the departure. Boards fetch departures up to
+# DEPARTURE_TRIGGER_MARGIN (more than the update interval) past the largest lead time, so that each departure is seen
+# by an update before its triggers are due.
+DEPARTURE_TRIGGER_THRESHOLD: Final = timedelta(seconds=30)
+DEPARTURE_TRIGGER_MAX_MINUTES: Final = 120
+DEPARTURE_TRIGGER_MARGIN: Final = timedelta(minutes=2)
+
+# Boards set up within WARMUP_DELAY of each other get their first data in a batched request per WARMUP_MAX_STOPS
+# stops. The response fetched by the config flow is the first data of the new board if younger than DEPARTURES_CACHE_TTL.
+WARMUP_DELAY: Final = timedelta(seconds=1)
+WARMUP_MAX_STOPS: Final = 50
@@ -1,12 +1,16 @@
+import asyncio
+from collections.abc import Callable, Mapping
 from datetime import timedelta
 import logging
 from typing import Any
-from urllib.parse import urlencode
+from urllib.parse import quote, urlencode
 
 import aiohttp
 
-from .const import API_URL, HTTP_TIMEOUT
-from .errors import CannotConnect, StopNotFound, WrongApiKey
+from homeassistant.util.json import json_loads_object
+
+from .const import API_URL, HTTP_TIMEOUT, PARSE_INLINE_MAX_BYTES, STOPS_URL, TRIPS_URL
+from .errors import CannotConnect, RateLimited, StopNotFound, WrongApiKey
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,43 +21,136 @@ class PIDDepartureBoardAPI:
     TIME_AFTER_RANGE = (timedelta(minutes=-4320), timedelta(minutes=4320))
     DEFAULT_TIME_BEFORE = timedelta(0)
     DEFAULT_TIME_AFTER = timedelta(minutes=4320)
+    MAX_LIMIT = 1000
+    STOPS_MAX_LIMIT = 10000
 
     @staticmethod
     async def async_fetch_data(
         api_key: str,
-        stop_id: str,
+        stop_id: str | list[str],
         limit: int = 1,
         time_before: timedelta = DEFAULT_TIME_BEFORE,
         time_after: timedelta = DEFAULT_TIME_AFTER,
+        on_headers: Callable[[Mapping[str, str]], None] | None = None,
+        decode: Callable[[dict[str, Any]], dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        """Get new data from API, departures of multiple stops are returned in a single merged response.
+
+        If given, on_headers is called with headers of the response (e.g. to read the remaining rate limit)
+        and decode is applied to the parsed response along with parsing (e.g. to convert departures to
+        a compact form), see async_parse_response.
+        """
+        stop_ids = [stop_id] if isinstance(stop_id, str) else stop_id
+        parameters = [
+            *(("aswIds", asw_id) for asw_id in stop_ids),
+            ("limit", min(limit, PIDDepartureBoardAPI.MAX_LIMIT)),
+            ("minutesBefore", int(time_before.total_seconds() / 60)),
+            ("minutesAfter", int(time_after.total_seconds() / 60)),
+        ]
+        return await PIDDepartureBoardAPI._async_get(API_URL, api_key, parameters, on_headers, decode)
+
+    @staticmethod
+    async def async_fetch_stops(
+        api_key: str,
+        limit: int = STOPS_MAX_LIMIT,
+        offset: int = 0,
+        on_headers: Callable[[Mapping[str, str]], None] | None = None,
+    ) -> dict[str, Any]:
+        """Get a page of GTFS stops (a GeoJSON feature collection) from API."""
+        parameters = [("limit", min(limit, PIDDepartureBoardAPI.STOPS_MAX_LIMIT)), ("offset", offset)]
+        return await PIDDepartureBoardAPI._async_get(STOPS_URL, api_key, parameters, on_headers)
+
+    @staticmethod
+    async def async_fetch_trip(
+        api_key: str,
+        trip_id: str,
+        on_headers: Callable[[Mapping[str, str]], None] | None = None,
+    ) -> dict[str, Any]:
+        """Get a GTFS trip with its stops (GeoJSON features in the order of the trip) from API."""
+        url = f"{TRIPS_URL}/{quote(trip_id, safe='')}"
+        return await PIDDepartureBoardAPI._async_get(url, api_key, [("includeStops", "true")], on_headers)
+
+    @staticmethod
+    async def _async_get(
+        url: str,
+        api_key: str,
+        parameters: list[tuple[str, Any]],
+        on_headers: Callable[[Mapping[str, str]], None] | None = None,
+        decode: Callable[[dict[str, Any]], dict[str, Any]] | None = None,
     ) -> dict[str, Any]:
-        """Get new data from API."""
         headers = {"Content-Type": "application/json; charset=utf-8", "x-access-token": api_key}
-        parameters = {
-            "aswIds": stop_id,
-            "limit": limit,
-            "minutesBefore": int(time_before.total_seconds() / 60),
-            "minutesAfter": int(time_after.total_seconds() / 60),
-        }
-
-        _LOGGER.debug(f"GET {API_URL}?{urlencode(parameters)}")
-        async with (
-            aiohttp.ClientSession(raise_for_status=False, timeout=HTTP_TIMEOUT) as http,
-            http.get(API_URL, params=parameters, headers=headers) as resp
-        ):
-            if _LOGGER.isEnabledFor(logging.DEBUG):
-                body = await resp.text()
-                _LOGGER.debug(f"Received response for GET {API_URL}: HTTP {resp.status}\n" +
-                              ellipsis(body, 1024))
-            if resp.status == 200:
-                data: dict[str, Any] = await resp.json()
-                return data
-            elif resp.status == 401:
-                raise WrongApiKey
-            elif resp.status == 404:
-                raise StopNotFound
-            else:
-                _LOGGER.error(f"GET {resp.url} returned HTTP {resp.status}")
-                raise CannotConnect
+
+        _LOGGER.debug(f"GET {url}?{urlencode(parameters)}")
+        try:
+            async with (
+                aiohttp.ClientSession(raise_for_status=False, timeout=HTTP_TIMEOUT) as http,
+                http.get(url, params=parameters, headers=headers) as resp
+            ):
+                if on_headers is not None:
+                    on_headers(resp.headers)
+                if _LOGGER.isEnabledFor(logging.DEBUG):
+                    body = await resp.text()
+                    _LOGGER.debug(f"Received response for GET {url}: HTTP {resp.status}\n" +
+                                  ellipsis(body, 1024))
+                if resp.status == 200:
+                    return await async_parse_response(await resp.read(), decode)
+                elif resp.status == 401:
+                    raise WrongApiKey
+                elif resp.status == 404:
+                    raise StopNotFound
+                elif resp.status == 429:
+                    raise RateLimited(retry_after=parse_retry_after(resp.headers.get("Retry-After")))
+                else:
+                    _LOGGER.error(f"GET {resp.url} returned HTTP {resp.status}")
+                    raise CannotConnect
+        except (aiohttp.ClientError, TimeoutError) as err:
+            _LOGGER.error(f"GET {url} failed: {err!r}")
+            raise CannotConnect from err
+
+
+async def async_parse_response(
+    body: bytes, decode: Callable[[dict[str, Any]], dict[str, Any]] | None = None
+) -> dict[str, Any]:
+    """Parse the response body (and decode it, if given).
+
+    Small bodies are parsed directly, large ones (e.g. 1000 departures for the calendar) in an executor,
+    so that parsing does not block the event loop.
+    """
+    if len(body) <= PARSE_INLINE_MAX_BYTES:
+        return parse_response(body, decode)
+    return await asyncio.get_running_loop().run_in_executor(None, parse_response, body, decode)
+
+
+def parse_response(body: bytes, decode: Callable[[dict[str, Any]], dict[str, Any]] | None = None) -> dict[str, Any]:
+    data = json_loads_object(body)
+    return decode(data) if decode is not None else data
+
+
+def split_by_stop(data: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Split a response for multiple stops into responses per ASW ID of the stop."""
+    result: dict[str, dict[str, Any]] = {}
+    gtfs_to_asw: dict[str, str] = {}
+    for stop in data["stops"]:
+        asw_id = f"{stop['asw_id']['node']}_{stop['asw_id']['stop']}"
+        gtfs_to_asw[stop["stop_id"]] = asw_id
+        result.setdefault(asw_id, {"stops": [], "departures": [], "infotexts": []})["stops"].append(stop)
+    for infotext in data["infotexts"]:
+        related = {stop if isinstance(stop, str) else stop["id"] for stop in infotext.get("related_stops") or []}
+        for part in result.values():
+            # Infotexts without related stops affect all of them.
+            if not related or any(stop["stop_id"] in related for stop in part["stops"]):
+                part["infotexts"].append(infotext)
+    for departure in data["departures"]:
+        if (asw_id := gtfs_to_asw.get(departure["stop"]["id"])) is not None:
+            result[asw_id]["departures"].append(departure)
+    return result
+
+
+def parse_retry_after(value: str | None) -> timedelta | None:
+    """Parse the Retry-After header given in seconds."""
+    if value is None or not value.isdigit():
+        return None
+    return timedelta(seconds=int(value))
 
 
 def ellipsis(text: str, maxlen: int) -> str:
@@ -0,0 +1,91 @@
+"""Device triggers of departure boards."""
+from __future__ import annotations
+
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.components.device_automation import DEVICE_TRIGGER_BASE_SCHEMA
+from homeassistant.components.homeassistant.triggers import event as event_trigger
+from homeassistant.const import CONF_DEVICE_ID, CONF_DOMAIN, CONF_PLATFORM, CONF_TYPE
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.trigger import TriggerActionType, TriggerInfo
+from homeassistant.helpers.typing import ConfigType
+
+from .const import DEPARTURE_TRIGGER_MAX_MINUTES, DOMAIN, EVENT_DEPARTURE
+from .triggers import TRIGGER_AT_STOP, TRIGGER_DEPARTURE_IN, register_lead_time
+
+CONF_MINUTES = "minutes"
+
+TRIGGER_TYPES = (TRIGGER_DEPARTURE_IN, TRIGGER_AT_STOP)
+
+MINUTES_SCHEMA = vol.All(vol.Coerce(int), vol.Range(0, DEPARTURE_TRIGGER_MAX_MINUTES))
+
+TRIGGER_SCHEMA = DEVICE_TRIGGER_BASE_SCHEMA.extend({
+    vol.Required(CONF_TYPE): vol.In(TRIGGER_TYPES),
+    vol.Optional(CONF_MINUTES, default=0): MINUTES_SCHEMA,
+})
+
+
+async def async_get_triggers(hass: HomeAssistant, device_id: str) -> list[dict[str, Any]]:
+    """Return triggers of a departure board device."""
+    if _entry_id(hass, device_id) is None:
+        return []
+    return [
+        {CONF_PLATFORM: "device", CONF_DOMAIN: DOMAIN, CONF_DEVICE_ID: device_id, CONF_TYPE: trigger_type}
+        for trigger_type in TRIGGER_TYPES
+    ]
+
+
+async def async_get_trigger_capabilities(hass: HomeAssistant, config: ConfigType) -> dict[str, vol.Schema]:
+    """Return the number of minutes before the departure as an extra field of departure_in triggers."""
+    if config[CONF_TYPE] != TRIGGER_DEPARTURE_IN:
+        return {}
+    return {"extra_fields": vol.Schema({vol.Required(CONF_MINUTES, default=5): MINUTES_SCHEMA})}
+
+
+async def async_attach_trigger(
+    hass: HomeAssistant,
+    config: ConfigType,
+    action: TriggerActionType,
+    trigger_info: TriggerInfo,
+) -> CALLBACK_TYPE:
+    """Attach a trigger listening to departure events of the board."""
+    entry_id = _entry_id(hass, config[CONF_DEVICE_ID])
+    event_data: dict[str, Any] = {"entry_id": entry_id, "type": config[CONF_TYPE]}
+    remove_lead_time: CALLBACK_TYPE | None = None
+    if config[CONF_TYPE] == TRIGGER_DEPARTURE_IN and entry_id is not None:
+        event_data[CONF_MINUTES] = config[CONF_MINUTES]
+        remove_lead_time = register_lead_time(hass, entry_id, config[CONF_MINUTES])
+
+    event_config = event_trigger.TRIGGER_SCHEMA({
+        event_trigger.CONF_PLATFORM: "event",
+        event_trigger.CONF_EVENT_TYPE: EVENT_DEPARTURE,
+        event_trigger.CONF_EVENT_DATA: event_data,
+    })
+    remove_listener = await event_trigger.async_attach_trigger(
+        hass, event_config, action, trigger_info, platform_type="device"
+    )
+
+    @callback
+    def async_remove() -> None:
+        remove_listener()
+        if remove_lead_time is not None:
+            remove_lead_time()
+
+    return async_remove
+
+
+def _entry_id(hass: HomeAssistant, device_id: str) -> str | None:
+    """Return the config entry of the board of the device.
+
+    Entries for the same stop share the device, the triggers then follow the board of one of them.
+    """
+    if (device := dr.async_get(hass).async_get(device_id)) is None:
+        return None
+    entry_ids = [
+        entry_id for entry_id in device.config_entries
+        if (entry := hass.config_entries.async_get_entry(entry_id)) is not None and entry.domain == DOMAIN
+    ]
+    return min(entry_ids, default=None)
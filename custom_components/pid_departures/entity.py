@@ -1,3 +1,4 @@
+from homeassistant.core import callback
 from homeassistant.helpers.entity import Entity
 
 from .hub import DepartureBoard
@@ -19,3 +20,23 @@ class BaseEntity(Entity):
         self._departure_board = departure_board
         self._attr_device_info = departure_board.device_info
         self._attr_unique_id = f"{departure_board.board_id}_{self.translation_key}"
+
+    @property
+    def available(self) -> bool:
+        """Entities are unavailable until the board receives its first data."""
+        return self._departure_board.initialized
+
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        # Entities not updated with every refresh of the board are written once when its first data arrive.
+        if not self._departure_board.initialized:
+            self._departure_board.register_callback(self._async_initialized)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        self._departure_board.remove_callback(self._async_initialized)
+
+    @callback
+    def _async_initialized(self) -> None:
+        self._departure_board.remove_callback(self._async_initialized)
+        self.async_write_ha_state()
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from homeassistant.exceptions import HomeAssistantError
 
 
@@ -5,10 +7,26 @@ class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect for unknown reason."""
 
 
+class GtfsFeedNotFound(HomeAssistantError):
+    """Error to indicate the GTFS feed file does not exist."""
+
+
+class InvalidWalkingOffsets(HomeAssistantError):
+    """Error to indicate additional walking offsets could not be parsed."""
+
+
 class NoDeparturesSelected(HomeAssistantError):
     """Error to indicate wrong stop was provided."""
 
 
+class RateLimited(CannotConnect):
+    """Error to indicate the rate limit of the API key was exceeded."""
+
+    def __init__(self, *args: object, retry_after: timedelta | None = None) -> None:
+        super().__init__(*args)
+        self.retry_after = retry_after
+
+
 class StopNotFound(HomeAssistantError):
     """Error to indicate wrong stop was provided."""
 
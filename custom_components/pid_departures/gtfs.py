@@ -0,0 +1,397 @@
+"""Offline timetable built from the static PID GTFS feed, used when the Golemio API is unavailable."""
+from __future__ import annotations
+
+from array import array
+import asyncio
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+import csv
+from datetime import date, datetime, time, timedelta
+import io
+import json
+import logging
+import mmap
+import os
+import threading
+from typing import Any
+import zipfile
+from zoneinfo import ZoneInfo
+
+from homeassistant.core import HomeAssistant
+
+from .hub import DepartureData
+
+_LOGGER = logging.getLogger(__name__)
+
+# GTFS times are relative to noon minus 12 hours of the service day in the timezone of the feed.
+TIMEZONE = ZoneInfo("Europe/Prague")
+INDEX_VERSION = 1
+# A trip may run past midnight, departures after 24:00:00 belong to the previous service day.
+MAX_SERVICE_DAY_OVERLAP = timedelta(days=1)
+
+
+def _read_table(feed: zipfile.ZipFile, name: str) -> Iterator[dict[str, str]]:
+    with feed.open(name) as file:
+        yield from csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig"))
+
+
+def _service_day_base(day: date) -> int:
+    """Return the timestamp GTFS times of the service day are relative to."""
+    return int(datetime.combine(day, time(12), TIMEZONE).timestamp()) - 12 * 3600
+
+
+def _parse_time(value: str) -> int:
+    """Parse GTFS time (H:MM:SS, may exceed 24 hours) into seconds since the start of a service day."""
+    hours, minutes, seconds = value.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def build_index(feed_path: str, index_path: str, asw_ids: Iterable[str]) -> None:
+    """Import departures of the given stops from the GTFS feed into an index (blocking).
+
+    Departures are written into a columnar file of int32 departure and arrival times and trip indexes,
+    grouped by stop and sorted by departure time, which is memory-mapped by GtfsTimetable. Trips,
+    routes, services and stops are written into a JSON file next to it.
+    """
+    wanted = set(asw_ids)
+    with zipfile.ZipFile(feed_path) as feed:
+        gtfs_to_asw: dict[str, str] = {}
+        stops: dict[str, dict[str, Any]] = {}
+        for row in _read_table(feed, "stops.txt"):
+            asw_id = f"{row.get('asw_node_id')}_{row.get('asw_stop_id')}"
+            if asw_id not in wanted:
+                continue
+            gtfs_to_asw[row["stop_id"]] = asw_id
+            # The first stop is kept, the same way the departure board API does.
+            stops.setdefault(asw_id, {
+                "stop_id": row["stop_id"],
+                "stop_name": row["stop_name"],
+                "stop_lat": float(row["stop_lat"]),
+                "stop_lon": float(row["stop_lon"]),
+                "zone_id": row.get("zone_id") or None,
+                "platform_code": row.get("platform_code") or None,
+                "wheelchair_boarding": int(row.get("wheelchair_boarding") or 0),
+            })
+
+        rows: list[tuple[str, str, int, int, int]] = []
+        last_sequence: dict[str, int] = {}
+        for row in _read_table(feed, "stop_times.txt"):
+            trip_id, sequence = row["trip_id"], int(row["stop_sequence"])
+            if sequence > last_sequence.get(trip_id, -1):
+                last_sequence[trip_id] = sequence
+            if (asw_id := gtfs_to_asw.get(row["stop_id"])) is None:
+                continue
+            departure = row["departure_time"] or row["arrival_time"]
+            arrival = row["arrival_time"] or departure
+            rows.append((asw_id, trip_id, sequence, _parse_time(departure), _parse_time(arrival)))
+
+        # Terminating trips do not depart from the stop.
+        rows = [row for row in rows if row[2] != last_sequence[row[1]]]
+        trip_ids = {row[1] for row in rows}
+
+        trips: dict[str, dict[str, str]] = {row["trip_id"]: row for row in _read_table(feed, "trips.txt")
+                                            if row["trip_id"] in trip_ids}
+        route_ids = {trip["route_id"] for trip in trips.values()}
+        service_ids = {trip["service_id"] for trip in trips.values()}
+        routes = {row["route_id"]: row for row in _read_table(feed, "routes.txt") if row["route_id"] in route_ids}
+
+        services: dict[str, dict[str, Any]] = {
+            service_id: {"days": 0, "start": 0, "end": 0, "added": [], "removed": []} for service_id in service_ids
+        }
+        if "calendar.txt" in feed.namelist():
+            weekdays = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+            for row in _read_table(feed, "calendar.txt"):
+                if (service := services.get(row["service_id"])) is not None:
+                    service["days"] = sum(1 << i for i, day in enumerate(weekdays) if row[day] == "1")
+                    service["start"], service["end"] = int(row["start_date"]), int(row["end_date"])
+        if "calendar_dates.txt" in feed.namelist():
+            for row in _read_table(feed, "calendar_dates.txt"):
+                if (service := services.get(row["service_id"])) is not None:
+                    service["added" if row["exception_type"] == "1" else "removed"].append(int(row["date"]))
+
+    route_idx = {route_id: idx for idx, route_id in enumerate(routes)}
+    service_idx = {service_id: idx for idx, service_id in enumerate(services)}
+    trip_idx = {trip_id: idx for idx, trip_id in enumerate(trips)}
+
+    rows.sort(key=lambda row: (row[0], row[3]))
+    departures, arrivals, trip_column = array("i"), array("i"), array("i")
+    stop_ranges: dict[str, list[int]] = {}
+    for asw_id, trip_id, _, departure, arrival in rows:
+        stop_ranges.setdefault(asw_id, [len(departures), 0])[1] += 1
+        departures.append(departure)
+        arrivals.append(arrival)
+        trip_column.append(trip_idx[trip_id])
+
+    meta = {
+        "version": INDEX_VERSION,
+        "feed_mtime": os.path.getmtime(feed_path),
+        "asw_ids": sorted(wanted),
+        "size": len(departures),
+        "stops": {asw_id: {**info, "range": stop_ranges.get(asw_id, [0, 0])} for asw_id, info in stops.items()},
+        "trips": [
+            [trip_id, route_idx[trip["route_id"]], service_idx[trip["service_id"]], trip.get("trip_headsign", ""),
+             trip.get("trip_short_name") or None, trip.get("wheelchair_accessible") == "1"]
+            for trip_id, trip in trips.items()
+        ],
+        "routes": [
+            [route.get("route_short_name") or None, int(route["route_type"]), route.get("is_night") == "1",
+             route.get("is_regional") == "1", route.get("is_substitute_transport") == "1"]
+            for route in routes.values()
+        ],
+        "services": list(services.values()),
+    }
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    with open(f"{index_path}.tmp", "wb") as file:
+        for column in (departures, arrivals, trip_column):
+            column.tofile(file)
+    os.replace(f"{index_path}.tmp", index_path)
+    with open(f"{index_path}.json.tmp", "w", encoding="utf-8") as file:
+        json.dump(meta, file, ensure_ascii=False)
+    os.replace(f"{index_path}.json.tmp", f"{index_path}.json")
+
+
+class _Service:
+    """Service calendar of a GTFS service_id."""
+
+    def __init__(self, data: dict[str, Any]) -> None:
+        self._days: int = data["days"]
+        self._start: int = data["start"]
+        self._end: int = data["end"]
+        self._added = frozenset(data["added"])
+        self._removed = frozenset(data["removed"])
+
+    def is_active(self, day: date) -> bool:
+        key = day.year * 10000 + day.month * 100 + day.day
+        if key in self._added:
+            return True
+        if key in self._removed:
+            return False
+        return self._start <= key <= self._end and bool(self._days & (1 << day.weekday()))
+
+
+class _Index:
+    """Memory-mapped departures of the imported stops.
+
+    Lookups run in executor threads, so the index counts them and is closed only after the last of them.
+    """
+
+    def __init__(self, index_path: str) -> None:
+        self._guard = threading.Lock()
+        self._readers = 0
+        self._closing = False
+        with open(f"{index_path}.json", encoding="utf-8") as file:
+            self.meta: dict[str, Any] = json.load(file)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported GTFS index version in {index_path}")
+        size: int = self.meta["size"]
+        self.services = [_Service(service) for service in self.meta["services"]]
+        self.asw_ids: frozenset[str] = frozenset(self.meta["asw_ids"])
+        self._file = open(index_path, "rb")
+        self._mmap: mmap.mmap | None = None
+        try:
+            # mmap cannot map an empty file.
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            view = memoryview(self._mmap if self._mmap is not None else b"")
+            try:
+                self._views = [view, view.cast("i")]
+            except TypeError:
+                # The mmap cannot be closed while a view of it exists.
+                view.release()
+                raise
+        except (OSError, ValueError, TypeError):
+            if self._mmap is not None:
+                self._mmap.close()
+            self._file.close()
+            raise
+        view = self._views[1]
+        self.departures, self.arrivals, self.trips = view[:size], view[size:2 * size], view[2 * size:3 * size]
+
+    def acquire(self) -> bool:
+        """Register a lookup, return False if the index is closed."""
+        with self._guard:
+            if self._closing:
+                return False
+            self._readers += 1
+            return True
+
+    def release(self) -> None:
+        """Unregister a lookup, closing the index if it was closed during the lookup."""
+        with self._guard:
+            self._readers -= 1
+            if not self._closing or self._readers:
+                return
+        self._close()
+
+    def close(self) -> None:
+        """Close the index, once running lookups are finished."""
+        with self._guard:
+            if self._closing:
+                return
+            self._closing = True
+            if self._readers:
+                return
+        self._close()
+
+    def _close(self) -> None:
+        for view in (self.departures, self.arrivals, self.trips, *reversed(self._views)):
+            view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+class GtfsTimetable:
+    """Scheduled departures of configured stops served from an index imported from a GTFS feed."""
+
+    def __init__(self, hass: HomeAssistant, feed_path: str, index_path: str) -> None:
+        self._hass = hass
+        self.feed_path = feed_path
+        self._index_path = index_path
+        self._index: _Index | None = None
+        self._lock = asyncio.Lock()
+
+    def has_stop(self, asw_id: str) -> bool:
+        """Return True if departures of the stop are available."""
+        return self._index is not None and asw_id in self._index.meta["stops"]
+
+    async def async_ensure_stops(self, asw_ids: Iterable[str]) -> None:
+        """Load the index, (re)importing the feed if it changed or the index misses any of the stops."""
+        async with self._lock:
+            wanted = set(asw_ids)
+            index = self._index
+            if index is None:
+                index = await self._hass.async_add_executor_job(self._load_index)
+            try:
+                feed_mtime = await self._hass.async_add_executor_job(os.path.getmtime, self.feed_path)
+            except OSError as err:
+                _LOGGER.error(f"GTFS feed {self.feed_path} is not available: {err!r}")
+                self._index = index
+                return
+            if index is not None and index.meta["feed_mtime"] == feed_mtime and wanted <= index.asw_ids:
+                self._index = index
+                return
+
+            if index is not None:
+                wanted |= index.asw_ids
+                index.close()
+            self._index = None
+            _LOGGER.info(f"Importing GTFS feed {self.feed_path} for {len(wanted)} stops")
+            try:
+                await self._hass.async_add_executor_job(build_index, self.feed_path, self._index_path, wanted)
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile) as err:
+                _LOGGER.error(f"Failed to import GTFS feed {self.feed_path}: {err!r}")
+                return
+            self._index = await self._hass.async_add_executor_job(self._load_index)
+
+    def _load_index(self) -> _Index | None:
+        try:
+            return _Index(self._index_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, TypeError, ValueError, KeyError, json.JSONDecodeError) as err:
+            _LOGGER.warning(f"Ignoring invalid GTFS index {self._index_path}: {err!r}")
+            return None
+
+    def close(self) -> None:
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def stop_info(self, asw_id: str) -> dict[str, Any]:
+        """Return the stop in the form of a stop in the departure board API response."""
+        assert self._index is not None
+        return {key: value for key, value in self._index.meta["stops"][asw_id].items() if key != "range"}
+
+    async def async_departures(
+        self, asw_id: str, start: datetime, end: datetime, limit: int | None = None
+    ) -> list[DepartureData]:
+        """Return scheduled departures from the stop between start and end, looked up in an executor."""
+        return await self._hass.async_add_executor_job(self.departures, asw_id, start, end, limit)
+
+    def departures(self, asw_id: str, start: datetime, end: datetime, limit: int | None = None) -> list[DepartureData]:
+        """Return scheduled departures from the stop between start and end sorted from earliest to latest (blocking).
+
+        Days of the range are scanned in order, scanning stops once the limit is reached by departures earlier
+        than any departure of the following days. No departures are returned if the index is being replaced.
+        """
+        index = self._index
+        if index is None or not index.acquire():
+            return []
+        try:
+            return self._departures(index, asw_id, start, end, limit)
+        finally:
+            # Views of the index used by the lookup are released by now.
+            index.release()
+
+    @staticmethod
+    def _departures(
+        index: _Index, asw_id: str, start: datetime, end: datetime, limit: int | None
+    ) -> list[DepartureData]:
+        stop = index.meta["stops"][asw_id]
+        offset, count = stop["range"]
+        departures, arrivals, trips = (column[offset:offset + count]
+                                       for column in (index.departures, index.arrivals, index.trips))
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+
+        found: list[tuple[int, int, int]] = []
+        day = (start.astimezone(TIMEZONE) - MAX_SERVICE_DAY_OVERLAP).date()
+        last_day = end.astimezone(TIMEZONE).date()
+        base = _service_day_base(day)
+        while day <= last_day:
+            next_base = _service_day_base(day + timedelta(days=1))
+            lo = bisect_left(departures, start_ts - base)
+            hi = bisect_right(departures, end_ts - base)
+            # Many departures share a service, each service is checked once a day.
+            active: dict[int, bool] = {}
+            for i in range(lo, hi):
+                service_idx = index.meta["trips"][trips[i]][2]
+                if (is_active := active.get(service_idx)) is None:
+                    is_active = active[service_idx] = index.services[service_idx].is_active(day)
+                if is_active:
+                    found.append((base + departures[i], base + arrivals[i], trips[i]))
+            if limit is not None and len(found) >= limit:
+                found.sort()
+                # Departures of the following service days are not earlier than the start of the next one.
+                if found[limit - 1][0] < next_base:
+                    break
+            day, base = day + timedelta(days=1), next_base
+        found.sort()
+        if limit is not None:
+            found = found[:limit]
+
+        result: list[DepartureData] = []
+        now = datetime.now(TIMEZONE)
+        for departure_ts, arrival_ts, trip_idx in found:
+            trip_id, route_idx, _, headsign, train_number, wheelchair = index.meta["trips"][trip_idx]
+            route_name, route_type, is_night, is_regional, is_substitute = index.meta["routes"][route_idx]
+            departure = datetime.fromtimestamp(departure_ts, TIMEZONE)
+            arrival = datetime.fromtimestamp(arrival_ts, TIMEZONE)
+            result.append(DepartureData(
+                arrival_time_est=arrival,
+                arrival_time_sched=arrival,
+                departure_time_est=departure,
+                departure_time_sched=departure,
+                departure_in_min=str(max(0, int((departure - now).total_seconds() // 60))),
+                is_delay_avail=False,
+                delay_min=None,
+                delay_sec=None,
+                route_name=route_name,
+                route_type=route_type,
+                train_number=train_number,
+                trip_id=trip_id,
+                trip_direction=None,
+                trip_headsign=headsign,
+                is_air_conditioned=False,
+                is_at_stop=False,
+                is_canceled=False,
+                is_night=is_night,
+                is_regional=is_regional,
+                is_substitute=is_substitute,
+                is_wheelchair_accessible=wheelchair,
+                last_stop_id=None,
+                last_stop_name=None,
+                stop_id=stop["stop_id"],
+                stop_platform=stop["platform_code"],
+            ))
+        return result
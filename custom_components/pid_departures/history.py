@@ -0,0 +1,190 @@
+"""Compact store of observed departure delays with per-route punctuality statistics."""
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable
+import os
+import struct
+
+from attrs import define
+
+_MAGIC = b"PIDH"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHII")  # magic, version, number of routes, number of records
+_LENGTH = struct.Struct("<H")
+
+
+@define
+class RouteStats:
+    """Rolling punctuality statistics of a route, updated incrementally."""
+
+    count: int = 0
+    canceled: int = 0
+    on_time: int = 0
+    delay_sum: int = 0
+
+    def add(self, delay_sec: int, is_canceled: bool, on_time_sec: int, sign: int = 1) -> None:
+        self.count += sign
+        if is_canceled:
+            self.canceled += sign
+        else:
+            self.delay_sum += sign * delay_sec
+            if delay_sec < on_time_sec:
+                self.on_time += sign
+
+    @property
+    def operated(self) -> int:
+        return self.count - self.canceled
+
+    @property
+    def punctuality(self) -> float | None:
+        """Share of operated departures which were on time, in percent."""
+        if self.operated == 0:
+            return None
+        return round(100 * self.on_time / self.operated, 1)
+
+    @property
+    def average_delay(self) -> float | None:
+        """Average delay of operated departures in seconds."""
+        if self.operated == 0:
+            return None
+        return round(self.delay_sum / self.operated, 1)
+
+
+class DelayHistory:
+    """Ring store of the last observed departures of a board.
+
+    Departures are kept in parallel arrays (columns), routes are interned into a table. Each trip is
+    stored once, repeated observations of the same departure overwrite its delay, so the store ends up
+    with the final delay observed. Statistics are updated on every change, never by scanning.
+    """
+
+    def __init__(self, capacity: int, on_time_sec: int) -> None:
+        self._capacity = capacity
+        self._on_time_sec = on_time_sec
+        self._head = 0
+        self._size = 0
+        self._trip_ids: list[str] = [""] * capacity
+        self._route_idx = array("H", bytes(2 * capacity))
+        self._scheduled = array("q", bytes(8 * capacity))
+        self._delay = array("i", bytes(4 * capacity))
+        self._canceled = array("b", bytes(capacity))
+        self._routes: list[str] = []
+        self._route_lookup: dict[str, int] = {}
+        self._slots: dict[tuple[str, int], int] = {}
+        self.route_stats: dict[str, RouteStats] = {}
+        self.total = RouteStats()
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    def observe(self, records: Iterable[tuple[str, str, int, int, bool]]) -> None:
+        """Record delays of departures which are tracked in realtime or canceled, given as
+        (trip ID, route, scheduled epoch second, delay in seconds, is canceled) records."""
+        for record in records:
+            self.record(*record)
+
+    def record(self, trip_id: str, route: str, scheduled: int, delay_sec: int, is_canceled: bool) -> None:
+        """Record an observed departure, replacing the previous observation of the same trip."""
+        key = (trip_id, scheduled)
+        if (slot := self._slots.get(key)) is not None:
+            if self._delay[slot] == delay_sec and bool(self._canceled[slot]) == is_canceled:
+                return
+            self._count(slot, -1)
+        else:
+            slot = self._head
+            if self._size == self._capacity:
+                self._count(slot, -1)
+                del self._slots[(self._trip_ids[slot], self._scheduled[slot])]
+            else:
+                self._size += 1
+            self._head = (self._head + 1) % self._capacity
+            self._slots[key] = slot
+            self._trip_ids[slot] = trip_id
+            self._route_idx[slot] = self._intern_route(route)
+            self._scheduled[slot] = scheduled
+
+        self._delay[slot] = delay_sec
+        self._canceled[slot] = is_canceled
+        self._count(slot, 1)
+        self.dirty = True
+
+    def _intern_route(self, route: str) -> int:
+        if (idx := self._route_lookup.get(route)) is None:
+            idx = self._route_lookup[route] = len(self._routes)
+            self._routes.append(route)
+            self.route_stats[route] = RouteStats()
+        return idx
+
+    def _count(self, slot: int, sign: int) -> None:
+        delay_sec, is_canceled = self._delay[slot], bool(self._canceled[slot])
+        self.route_stats[self._routes[self._route_idx[slot]]].add(delay_sec, is_canceled, self._on_time_sec, sign)
+        self.total.add(delay_sec, is_canceled, self._on_time_sec, sign)
+
+    def _ordered_slots(self) -> list[int]:
+        """Return occupied slots from the oldest to the newest."""
+        start = self._head if self._size == self._capacity else 0
+        return [(start + i) % self._capacity for i in range(self._size)]
+
+    def to_bytes(self) -> bytes:
+        """Serialize the store into a binary columnar format."""
+        slots = self._ordered_slots()
+        chunks = [_HEADER.pack(_MAGIC, _VERSION, len(self._routes), len(slots))]
+        for text in (*self._routes, *(self._trip_ids[slot] for slot in slots)):
+            encoded = text.encode()
+            chunks += (_LENGTH.pack(len(encoded)), encoded)
+        for column in (self._route_idx, self._scheduled, self._delay, self._canceled):
+            chunks.append(array(column.typecode, (column[slot] for slot in slots)).tobytes())
+        return b"".join(chunks)
+
+    def load_bytes(self, data: bytes) -> None:
+        """Replay records serialized by to_bytes."""
+        magic, version, routes_count, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Unsupported delay history format")
+        offset = _HEADER.size
+        texts: list[str] = []
+        for _ in range(routes_count + count):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            texts.append(data[offset:offset + length].decode())
+            offset += length
+        routes, trip_ids = texts[:routes_count], texts[routes_count:]
+
+        columns: list[array[int]] = []
+        for typecode in ("H", "q", "i", "b"):
+            column = array(typecode)
+            column.frombytes(data[offset:offset + column.itemsize * count])
+            offset += column.itemsize * count
+            columns.append(column)
+
+        for trip_id, route_idx, scheduled, delay_sec, is_canceled in zip(trip_ids, *columns):
+            self.record(trip_id, routes[route_idx], scheduled, delay_sec, bool(is_canceled))
+        self.dirty = False
+
+
+def read_file(path: str) -> bytes | None:
+    """Read a history file (blocking), return None if it does not exist."""
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_file(path: str, data: bytes) -> None:
+    """Atomically write a history file (blocking)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def remove_file(path: str) -> None:
+    """Remove a history file (blocking), if it exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
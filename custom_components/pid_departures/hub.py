@@ -1,16 +1,45 @@
 from __future__ import annotations
 
-from attrs import asdict, converters, define, field, fields
-from collections.abc import Callable
+import asyncio
+from attrs import asdict, define, field, fields
+from collections.abc import Callable, Sequence
 from datetime import datetime, timedelta
 from functools import reduce
-from typing import Any, cast
+import logging
+import math
+import struct
+from typing import TYPE_CHECKING, Any, cast
 
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity import DeviceInfo
-
-from .const import DOMAIN, RouteType
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.util import dt
+
+from .const import (
+    DEPARTURE_TRIGGER_MARGIN,
+    DOMAIN,
+    FETCH_LIMIT_SHRINK_UPDATES,
+    HISTORY_CAPACITY,
+    HISTORY_ON_TIME_SEC,
+    HISTORY_SAVE_INTERVAL,
+    TIMELINE_FULL_REFRESH,
+    TIMELINE_NEAR_REFRESH,
+    TIMELINE_NEAR_WINDOW,
+    RouteType,
+)
+from .columnar import DepartureChain, DepartureColumns, decode_departures
 from .dep_board_api import PIDDepartureBoardAPI
+from .errors import CannotConnect, StopNotFound, WrongApiKey
+from .history import DelayHistory, read_file, write_file
+from .infotexts import InfotextStore
+from .keypool import ApiKeyPool
+from .timeline import DepartureTimeline
+from .triggers import DepartureTriggers
+
+if TYPE_CHECKING:
+    from .gtfs import GtfsTimetable
+
+_LOGGER = logging.getLogger(__name__)
 
 
 # Based on PID Departure Board schema in https://api.golemio.cz/pid/docs/openapi/.
@@ -24,12 +53,17 @@ ROUTE_TYPES_NUM = {
     11: RouteType.TROLLEYBUS
 }
 
-def parse_route_type(num: int | None) -> RouteType:
+def parse_route_type(num: int | RouteType | None) -> RouteType:
+    if isinstance(num, RouteType):
+        return num
     if num is None:
         return RouteType.UNKNOWN
     return ROUTE_TYPES_NUM.get(num) or RouteType.UNKNOWN
 
-parse_datetime = converters.optional(datetime.fromisoformat)
+def parse_datetime(value: str | datetime | None) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
 
 
 # Based on PID Departure Board schema in https://api.golemio.cz/pid/docs/openapi/.
@@ -75,20 +109,62 @@ class DepartureData:
         return asdict(self)
 
 
+def history_path(hass: HomeAssistant, entry_id: str) -> str:
+    """Path of the file the delay history of the board of the config entry is persisted in."""
+    return hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry_id}.history")
+
+
 class DepartureBoard:
     """Setting Departure board as device."""
 
-    def __init__(self, hass: HomeAssistant, api_key: str, stop_id: str, conn_num: int, walking_offset: int = 0) -> None:
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        api_key: str,
+        stop_id: str,
+        conn_num: int,
+        walking_offset: int = 0,
+        events_count: int = 0,
+        gtfs: GtfsTimetable | None = None,
+        infotexts: InfotextStore | None = None,
+        key_pool: ApiKeyPool | None = None,
+        extra_walking_offsets: list[int] | None = None,
+        title: str | None = None,
+        entry_id: str | None = None,
+    ) -> None:
         """Initialize departure board."""
         super().__init__()
         self._hass = hass
         self._api_key: str = api_key
         self._stop_id: str = stop_id
+        self._title = title or stop_id
+        # Several config entries may show the same stop, state persisted or published per board is keyed by the entry.
+        self.entry_id: str = entry_id or stop_id
         self.conn_num: int = int(conn_num)
         self.walking_offset: int = walking_offset  # User input in minutes (positive = future)
+        # Offsets of all views of the board, the first one is the main view.
+        self.walking_offsets: list[int] = list(dict.fromkeys([walking_offset, *(extra_walking_offsets or [])]))
+        self.events_count: int = int(events_count)
+        self.gtfs = gtfs
+        self.infotexts = infotexts if infotexts is not None else InfotextStore()
+        if key_pool is None:
+            key_pool = ApiKeyPool()
+            key_pool.register(stop_id, [api_key])
+        self.key_pool = key_pool
         self.response: dict[str, Any] = {}
-        self._departures: list[DepartureData] = []
+        self.timeline = DepartureTimeline()
+        self.history = DelayHistory(HISTORY_CAPACITY, HISTORY_ON_TIME_SEC)
+        self._history_saved: datetime = dt.now()
+        self._departures: DepartureColumns = DepartureColumns()
+        self._view_starts: dict[int, int] = {}
+        self._fetch_limit: int = self.conn_num
+        self._fetch_limit_shrinks: int = 0
         self._callbacks: set[Callable[[], None]] = set()
+        self._timeline_refreshing: bool = False
+        # Refreshes of the timeline (in background and by queries) are serialized, so they do not duplicate requests.
+        self._timeline_lock = asyncio.Lock()
+        self.triggers = DepartureTriggers(hass, self.entry_id, stop_id)
+        self.updated: datetime | None = None
 
     @property
     def board_id(self) -> str:
@@ -100,9 +176,17 @@ class DepartureBoard:
         """ Provides a device info. """
         return {"identifiers": {(DOMAIN, self.board_id)}, "name": self.name, "manufacturer": "Prague Integrated Transport"}
 
+    @property
+    def initialized(self) -> bool:
+        """Return True once the board has received its first data."""
+        return bool(self.response.get("stops"))
+
     @property
     def name(self) -> str:
         """Provides name for departure board."""
+        if not self.initialized:
+            # Until the first data is received, the title of the config entry is used.
+            return self._title
         return self.stop_name + " " + self.platform
 
     @property
@@ -120,9 +204,14 @@ class DepartureBoard:
         return value
 
     @property
-    def departures(self) -> list[DepartureData]:
+    def departures(self) -> Sequence[DepartureData]:
         """Return a list of fetched departures from this stop sorted from earliest to latest."""
-        return self._departures
+        return self.view_departures(self.walking_offset)
+
+    def view_departures(self, walking_offset: int) -> Sequence[DepartureData]:
+        """Return departures of the view with the given walking offset sorted from earliest to latest."""
+        start = self._view_starts.get(walking_offset, 0)
+        return self._departures[start:start + self.conn_num]
 
     @property
     def latitude(self) -> float:
@@ -134,6 +223,11 @@ class DepartureBoard:
         """Returns longitude of the stop."""
         return self.response["stops"][0]["stop_lon"]  # type: ignore[Any]
 
+    @property
+    def fetch_limit(self) -> int:
+        """Number of departures requested to fill all views of the board."""
+        return self._fetch_limit
+
     @property
     def api_key(self) -> str:
         """ Returns API key."""
@@ -141,23 +235,269 @@ class DepartureBoard:
 
     async def async_update(self) -> None:
         """ Updates the data from API."""
+        try:
+            data = await self._async_fetch_views()
+        except CannotConnect:
+            if not self.has_timetable:
+                raise
+            _LOGGER.debug(f"API is not available, using scheduled departures of {self.board_id} from GTFS")
+            await self._async_update_from_timetable()
+        else:
+            self._set_response(data)
+        await self._async_updated()
+
+    async def async_seed(self, data: dict[str, Any], truncated: bool = False) -> bool:
+        """Use a response fetched for this board elsewhere (by the config flow or the batched warm-up)
+        instead of updating the data from API.
+
+        Returns False, leaving the board unchanged, when the response was truncated before all views
+        of the board were filled.
+        """
+        if not isinstance(data["departures"], DepartureColumns):
+            data = decode_departures(dict(data))
+        departures = cast(DepartureColumns, data["departures"])
+        previous = self._departures, self._view_starts
+        needed = self._set_views(departures, dt.now())
+        self._adapt_fetch_limit(needed)
+        if truncated and needed > len(departures):
+            self._departures, self._view_starts = previous
+            return False
+        self._set_response(data)
+        await self._async_updated()
+        return True
+
+    def _set_response(self, data: dict[str, Any]) -> None:
+        self.response = data
+        self.infotexts.ingest(self.gtfs_stop_ids, data["infotexts"], dt.now())
+        # The shared infotext store is the only holder of infotexts, boards do not keep their own copies.
+        data["infotexts"] = []
+
+    async def _async_updated(self) -> None:
+        self.updated = dt.now()
+        self.history.observe(self._departures.delay_records())
+        self.triggers.update(self._departures, dt.now())
+        await self.publish_updates()
+
+        if self.history.dirty and dt.now() - self._history_saved >= HISTORY_SAVE_INTERVAL:
+            await self.async_save_history()
+
+        # The timeline is prefetched by the first calendar query, boards whose calendar is never queried (and all
+        # boards right after a restart) do not request the whole API range.
+        if self.events_count > 0 and self.timeline.full_refreshed is not None and not self._timeline_refreshing:
+            self._hass.async_create_background_task(
+                self._async_refresh_timeline_in_background(), f"{DOMAIN} timeline {self.board_id}"
+            )
+
+    async def _async_fetch_views(self) -> dict[str, Any]:
+        """Fetch departures for all views of the board in a single request.
+
+        The request covers the window of the earliest view, later views skip departures before their start.
+        When the response is truncated before the last view is filled, it is repeated with a larger limit,
+        which is then used by subsequent updates.
+        """
         # Convert user-friendly walking offset to API format
         # User: positive = future, negative = past (intuitive)
         # API: positive = past, negative = future (counter-intuitive)
         # So we invert the sign and convert minutes to timedelta
-        api_offset_minutes = -self.walking_offset
+        api_offset_minutes = -min(self.walking_offsets)
         walking_offset_timedelta = timedelta(minutes=api_offset_minutes)
 
-        data = await PIDDepartureBoardAPI.async_fetch_data(
-            self.api_key,
+        limit = self._fetch_limit
+        while True:
+            data = await self.key_pool.async_fetch_data(
+                self._stop_id,
+                limit,
+                time_before=walking_offset_timedelta,
+                decode=decode_departures,
+            )
+            departures = cast(DepartureColumns, data["departures"])
+            needed = self._set_views(departures, dt.now())
+            if needed <= limit or len(departures) < limit or limit >= PIDDepartureBoardAPI.MAX_LIMIT:
+                break
+            limit = min(max(needed, 2 * limit), PIDDepartureBoardAPI.MAX_LIMIT)
+        self._adapt_fetch_limit(needed)
+        return data
+
+    def _adapt_fetch_limit(self, needed: int) -> None:
+        """Set the limit of the next request to the departures needed with headroom, so that a departure more
+        before the start of a later view does not cost another request."""
+        headroom = self.conn_num if len(self.walking_offsets) > 1 else 0
+        limit = min(needed + headroom, PIDDepartureBoardAPI.MAX_LIMIT)
+        if limit >= self._fetch_limit:
+            self._fetch_limit = limit
+            self._fetch_limit_shrinks = 0
+            return
+        self._fetch_limit_shrinks += 1
+        if self._fetch_limit_shrinks >= FETCH_LIMIT_SHRINK_UPDATES:
+            self._fetch_limit = limit
+            self._fetch_limit_shrinks = 0
+
+    def _set_views(self, departures: DepartureColumns, now: datetime) -> int:
+        """Set departures of the views and return the number of departures needed to fill all of them (and to see
+        departures before their triggers are due)."""
+        self._departures = departures
+        earliest = min(self.walking_offsets)
+        self._view_starts = {}
+        instants = [(idx, instant) for idx in range(len(departures)) if (instant := departures.instant(idx)) is not None]
+        for offset in self.walking_offsets:
+            start = 0
+            if offset != earliest:
+                threshold = int((now + timedelta(minutes=offset)).timestamp())
+                start = next((idx for idx, instant in instants if instant >= threshold), len(departures))
+                if start == len(departures) and len(instants) > 1 and instants[-1][1] > instants[0][1]:
+                    # The view starts after the last departure, estimate its start from the frequency of departures.
+                    (first_idx, first), (last_idx, last) = instants[0], instants[-1]
+                    start = first_idx + math.ceil((last_idx - first_idx) * (threshold - first) / (last - first))
+            self._view_starts[offset] = start
+        needed = max(self._view_starts.values()) + self.conn_num
+        if lead_times := self.triggers.lead_times:
+            horizon = int((now + timedelta(minutes=max(lead_times)) + DEPARTURE_TRIGGER_MARGIN).timestamp())
+            needed = max(needed, next((idx for idx, instant in instants if instant > horizon), len(departures) + 1))
+        return needed
+
+    @property
+    def has_timetable(self) -> bool:
+        """Return True if scheduled departures from GTFS are available for this stop."""
+        return self.gtfs is not None and self.gtfs.has_stop(self._stop_id)
+
+    async def _async_update_from_timetable(self) -> None:
+        assert self.gtfs is not None
+        now = dt.now()
+        start = now + timedelta(minutes=min(self.walking_offsets))
+        self._set_views(DepartureColumns.from_departures(await self.gtfs.async_departures(
+            self._stop_id, start, start + PIDDepartureBoardAPI.TIME_AFTER_RANGE[1], self._fetch_limit
+        )), now)
+        # Keep stop details and infotexts from the last API response, if there is any.
+        self.response = {
+            "stops": [self.gtfs.stop_info(self._stop_id)],
+            "infotexts": [],
+            **self.response,
+            "departures": [],
+        }
+
+    async def async_get_departures_between(
+        self, start: datetime, end: datetime, limit: int | None = None
+    ) -> Sequence[DepartureData]:
+        """Return departures between start and end from the timeline, completed with scheduled departures
+        from GTFS beyond the range covered by the API."""
+        timeline = self.timeline
+        async with self._timeline_lock:
+            if timeline.full_refreshed is None:
+                # The timeline is fetched by the first query, then refreshed in background with board updates.
+                try:
+                    await self._async_update_timeline(dt.now())
+                except CannotConnect:
+                    if not self.has_timetable:
+                        raise
+
+            # A response holds at most MAX_LIMIT departures, so at busy stops the prefetched timeline ends well
+            # before the range of the API. The rest of the range is fetched when a query reaches past it.
+            now = dt.now()
+            api_end = min(end, now + PIDDepartureBoardAPI.TIME_AFTER_RANGE[1])
+            while timeline.end is not None and timeline.end < api_end and (
+                limit is None or len(timeline.between(start, end, limit)) < limit
+            ):
+                covered = timeline.end
+                try:
+                    await self._async_fetch_timeline(now, covered, api_end)
+                except CannotConnect:
+                    if not self.has_timetable:
+                        raise
+                    break
+                if timeline.end <= covered:
+                    break
+
+        departures = timeline.between(start, end, limit)
+        if self.has_timetable and (limit is None or len(departures) < limit):
+            assert self.gtfs is not None
+            if timeline.end is not None:
+                start = max(start, timeline.end + timedelta(seconds=1))
+            if start <= end:
+                # Departures of the timeline stay lazy, they may be materialized in an executor by the caller.
+                departures = DepartureChain(departures, await self.gtfs.async_departures(
+                    self._stop_id, start, end, None if limit is None else limit - len(departures)
+                ))
+        return departures
+
+    async def async_update_timeline(self, now: datetime | None = None) -> None:
+        """Refresh the timeline for the calendar.
+
+        The whole API range is refetched once in TIMELINE_FULL_REFRESH, in between only the near-term
+        part of the timeline, which changes with realtime delays, is refetched.
+        """
+        async with self._timeline_lock:
+            await self._async_update_timeline(now or dt.now())
+
+    async def _async_update_timeline(self, now: datetime) -> None:
+        timeline = self.timeline
+        time_before = PIDDepartureBoardAPI.TIME_BEFORE_RANGE[1]
+        if timeline.full_refreshed is None or now - timeline.full_refreshed >= TIMELINE_FULL_REFRESH:
+            time_after = PIDDepartureBoardAPI.TIME_AFTER_RANGE[1]
+            full = True
+        elif timeline.near_refreshed is None or now - timeline.near_refreshed >= TIMELINE_NEAR_REFRESH:
+            time_after = TIMELINE_NEAR_WINDOW
+            full = False
+        else:
+            return
+
+        start = now - time_before
+        timeline.prune(start)
+        await self._async_fetch_timeline(now, start, now + time_after)
+        timeline.near_refreshed = now
+        if full:
+            timeline.full_refreshed = now
+
+    async def _async_fetch_timeline(self, now: datetime, start: datetime, end: datetime) -> None:
+        """Replace departures of the timeline between start and end with fresh ones from API.
+
+        A truncated response covers the range only up to its last departure, the timeline ends there.
+        """
+        data = await self.key_pool.async_fetch_data(
             self._stop_id,
-            self.conn_num,
-            time_before=walking_offset_timedelta
+            PIDDepartureBoardAPI.MAX_LIMIT,
+            time_before=now - start,
+            time_after=end - now,
+            decode=decode_departures,
         )
-        self.response = data
-        self._departures = [DepartureData.from_api(dep)
-                            for dep in cast(list[dict[str, Any]], data["departures"])]
-        await self.publish_updates()
+        departures = cast(DepartureColumns, data["departures"])
+        if len(departures) >= PIDDepartureBoardAPI.MAX_LIMIT:
+            instants = [instant for idx in range(len(departures)) if (instant := departures.instant(idx)) is not None]
+            if instants:
+                end = datetime.fromtimestamp(max(instants), end.tzinfo)
+        self.timeline.merge(departures, start, end)
+
+    async def _async_refresh_timeline_in_background(self) -> None:
+        self._timeline_refreshing = True
+        try:
+            await self.async_update_timeline()
+        except (CannotConnect, StopNotFound, WrongApiKey) as err:
+            _LOGGER.warning(f"Failed to refresh departures timeline of {self.board_id}: {err!r}")
+        finally:
+            self._timeline_refreshing = False
+
+    @property
+    def history_path(self) -> str:
+        """Path of the file the delay history is persisted in."""
+        return history_path(self._hass, self.entry_id)
+
+    async def async_load_history(self) -> None:
+        """Load the delay history persisted by a previous run."""
+        path = self.history_path
+        if (data := await self._hass.async_add_executor_job(read_file, path)) is None:
+            return
+        try:
+            self.history.load_bytes(data)
+        except (ValueError, struct.error, UnicodeDecodeError) as err:
+            _LOGGER.warning(f"Ignoring corrupted delay history {path}: {err!r}")
+
+    async def async_save_history(self) -> None:
+        """Persist the delay history if it has changed."""
+        if not self.history.dirty:
+            return
+        data = self.history.to_bytes()
+        self.history.dirty = False
+        self._history_saved = dt.now()
+        await self._hass.async_add_executor_job(write_file, self.history_path, data)
 
     def register_callback(self, callback: Callable[[], None]) -> None:
         """Register callback, called when there are new data."""
@@ -169,7 +509,8 @@ class DepartureBoard:
 
     async def publish_updates(self) -> None:
         """Schedule call to all registered callbacks."""
-        for callback in self._callbacks:
+        # Callbacks may remove themselves.
+        for callback in list(self._callbacks):
             callback()
 
     @property
@@ -182,12 +523,22 @@ class DepartureBoard:
         """Zone of the stop"""
         return self.response["stops"][0]["zone_id"]  # type: ignore[Any]
 
+    @property
+    def gtfs_stop_ids(self) -> list[str]:
+        """GTFS IDs of the stops of the board."""
+        return [stop["stop_id"] for stop in self.response.get("stops", [])]  # type: ignore[Any]
+
+    @property
+    def info_texts(self) -> list[dict[str, Any]]:
+        """All info texts affecting the stop."""
+        return self.infotexts.for_stops(self.gtfs_stop_ids)
+
     @property
     def info_text(self) -> tuple[bool, dict[str, Any]]:
         """ State and content of info text"""
-        if len(self.response["infotexts"]) != 0:  # type: ignore[Any]
+        if texts := self.info_texts:
             state = True
-            text: dict[str, Any] = self.response["infotexts"][0]
+            text: dict[str, Any] = texts[0]
         else:
             state = False
             text = {}
@@ -0,0 +1,73 @@
+"""Infotexts (service disruption texts) shared by departure boards."""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any
+
+
+def infotext_key(infotext: dict[str, Any]) -> str:
+    """Return a key identifying the same infotext across API responses."""
+    if infotext.get("id") is not None:
+        return str(infotext["id"])
+    return f"{infotext.get('valid_from')}|{infotext.get('text')}"
+
+
+class InfotextStore:
+    """Infotexts received by all departure boards using the same API key.
+
+    Network-wide infotexts are repeated in responses of every board. The store keeps a single object per
+    infotext (interned by its id) and an index of stops to infotexts affecting them, so boards reference
+    shared objects instead of holding their own copies.
+    """
+
+    def __init__(self) -> None:
+        self._texts: dict[str, dict[str, Any]] = {}
+        self._by_stop: dict[str, list[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def ingest(self, stop_ids: Iterable[str], infotexts: list[dict[str, Any]], now: datetime) -> None:
+        """Store infotexts from a departure board response for the given (GTFS) stops."""
+        keys: list[str] = []
+        for infotext in infotexts:
+            key = infotext_key(infotext)
+            if self._texts.get(key) != infotext:
+                self._texts[key] = infotext
+            keys.append(key)
+            for related in infotext.get("related_stops") or []:
+                stop_keys = self._by_stop.setdefault(related if isinstance(related, str) else related["id"], [])
+                if key not in stop_keys:
+                    stop_keys.append(key)
+
+        # The response contains all the infotexts valid for its stops, so it replaces the previous ones.
+        for stop_id in stop_ids:
+            self._by_stop[stop_id] = list(keys)
+        self._purge(now)
+
+    def for_stops(self, stop_ids: Iterable[str]) -> list[dict[str, Any]]:
+        """Return infotexts affecting any of the given (GTFS) stops."""
+        keys = dict.fromkeys(key for stop_id in stop_ids for key in self._by_stop.get(stop_id, ()))
+        return [self._texts[key] for key in keys if key in self._texts]
+
+    def _purge(self, now: datetime) -> None:
+        """Drop expired infotexts and infotexts no longer referenced by any stop."""
+        referenced = {key for keys in self._by_stop.values() for key in keys}
+        for key, infotext in list(self._texts.items()):
+            if key not in referenced or _is_expired(infotext, now):
+                del self._texts[key]
+        for stop_id, keys in list(self._by_stop.items()):
+            if any(key not in self._texts for key in keys):
+                if not (keys := [key for key in keys if key in self._texts]):
+                    del self._by_stop[stop_id]
+                else:
+                    self._by_stop[stop_id] = keys
+
+
+def _is_expired(infotext: dict[str, Any], now: datetime) -> bool:
+    try:
+        valid_to = datetime.fromisoformat(infotext["valid_to"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return valid_to < now
@@ -0,0 +1,191 @@
+"""Pool of Golemio API keys shared by all departure boards."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import copy
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from datetime import datetime
+import logging
+from typing import Any
+
+from attrs import define, field
+
+from homeassistant.util import dt
+
+from .const import KEY_EVICT_RATE_LIMITED, KEY_EVICT_WRONG, KEY_RATE_LIMIT, KEY_RATE_WINDOW
+from .dep_board_api import PIDDepartureBoardAPI
+from .errors import CannotConnect, RateLimited, WrongApiKey
+
+_LOGGER = logging.getLogger(__name__)
+
+RATE_LIMIT_REMAINING_HEADERS = ("RateLimit-Remaining", "X-RateLimit-Remaining")
+
+
+@define
+class KeyUsage:
+    """Usage counters of an API key."""
+
+    requests: int = 0
+    failures: int = 0
+    rate_limited: int = 0
+    evicted_until: datetime | None = None
+    remaining: int | None = None
+    remaining_at: datetime | None = None
+    recent: deque[datetime] = field(factory=deque)
+
+    def budget(self, now: datetime) -> int:
+        """Return the number of requests which can be made with the key in the current rate limit window."""
+        while self.recent and now - self.recent[0] >= KEY_RATE_WINDOW:
+            self.recent.popleft()
+        # The budget reported by the API is preferred, the local estimate is used when it is not known or outdated.
+        if self._reported(now):
+            remaining_at = self.remaining_at
+            return self.remaining - sum(1 for time in self.recent if time > remaining_at)  # type: ignore[operator]
+        return KEY_RATE_LIMIT - len(self.recent)
+
+    def replenished_at(self, now: datetime) -> datetime:
+        """Return when the budget of the key may grow, i.e. when the budget reported by the API gets outdated
+        or when the oldest request leaves the rate limit window."""
+        if self._reported(now):
+            return self.remaining_at + KEY_RATE_WINDOW  # type: ignore[operator]
+        return (self.recent[0] if self.recent else now) + KEY_RATE_WINDOW
+
+    def _reported(self, now: datetime) -> bool:
+        return self.remaining is not None and self.remaining_at is not None and now - self.remaining_at < KEY_RATE_WINDOW
+
+
+class ApiKeyPool:
+    """API keys registered by all config entries.
+
+    Each request is made with the key that has the largest remaining budget. When the budgets of all keys are
+    used up, the request waits until a key is replenished. A key rejected by the API (wrong key or rate limit
+    exceeded although budget was left) is evicted for a while and the request is retried with another one.
+    """
+
+    def __init__(self) -> None:
+        self._entry_keys: dict[str, list[str]] = {}
+        self.usage: dict[str, KeyUsage] = {}
+        # Error the last evicted key was rejected with, reported while no key is available.
+        self._eviction_error: CannotConnect | WrongApiKey | None = None
+
+    @property
+    def keys(self) -> list[str]:
+        return list(self.usage)
+
+    def register(self, entry_id: str, keys: Iterable[str]) -> None:
+        """Add keys of a config entry to the pool."""
+        self._entry_keys[entry_id] = list(keys)
+        self._sync()
+
+    def unregister(self, entry_id: str) -> None:
+        """Remove keys of a config entry from the pool, unless they are used by other entries."""
+        self._entry_keys.pop(entry_id, None)
+        self._sync()
+
+    def _sync(self) -> None:
+        keys = dict.fromkeys(key for keys in self._entry_keys.values() for key in keys)
+        self.usage = {key: self.usage.get(key) or KeyUsage() for key in keys}
+
+    def acquire(self, now: datetime, exclude: Iterable[str] = ()) -> str | None:
+        """Return the available key with the largest remaining budget, None if the budgets of all available keys
+        are used up."""
+        available = self._available(now, exclude)
+        if not available:
+            raise RateLimited("No API key is available")
+        budget, _, key = max((usage.budget(now), -len(usage.recent), key) for key, usage in available.items())
+        return key if budget > 0 else None
+
+    def replenished_at(self, now: datetime, exclude: Iterable[str] = ()) -> datetime:
+        """Return when the budget of an available key may grow."""
+        return min(usage.replenished_at(now) for usage in self._available(now, exclude).values())
+
+    def _available(self, now: datetime, exclude: Iterable[str]) -> dict[str, KeyUsage]:
+        excluded = set(exclude)
+        return {
+            key: usage for key, usage in self.usage.items()
+            if key not in excluded and (usage.evicted_until is None or usage.evicted_until <= now)
+        }
+
+    async def async_fetch_data(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        """Get new data from API (see PIDDepartureBoardAPI.async_fetch_data) with a key from the pool."""
+        return await self.async_request(PIDDepartureBoardAPI.async_fetch_data, *args, **kwargs)
+
+    async def async_fetch_stops(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        """Get GTFS stops from API (see PIDDepartureBoardAPI.async_fetch_stops) with a key from the pool."""
+        return await self.async_request(PIDDepartureBoardAPI.async_fetch_stops, *args, **kwargs)
+
+    async def async_fetch_trip(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        """Get a GTFS trip from API (see PIDDepartureBoardAPI.async_fetch_trip) with a key from the pool."""
+        return await self.async_request(PIDDepartureBoardAPI.async_fetch_trip, *args, **kwargs)
+
+    async def async_request(
+        self, request: Callable[..., Awaitable[dict[str, Any]]], *args: Any, **kwargs: Any
+    ) -> dict[str, Any]:
+        """Make an API request, given as an API method taking the key as its first argument, with a key from
+        the pool."""
+        tried: list[str] = []
+        error: CannotConnect | WrongApiKey | None = None
+        while True:
+            now = dt.now()
+            try:
+                key = self.acquire(now, tried)
+            except RateLimited:
+                # All keys were tried, report the error of the last one.
+                if error is not None:
+                    raise error from None
+                # The keys were evicted by earlier requests, report why the last of them was rejected.
+                if self._eviction_error is not None:
+                    raise copy.copy(self._eviction_error) from None
+                raise
+            if key is None:
+                # The rate limit would be exceeded, throttle the request locally instead of getting the keys evicted.
+                await asyncio.sleep((self.replenished_at(now, tried) - now).total_seconds())
+                continue
+            tried.append(key)
+            usage = self.usage[key]
+            usage.requests += 1
+            usage.recent.append(now)
+            try:
+                return await request(
+                    key, *args, on_headers=lambda headers: self._update_remaining(usage, headers), **kwargs
+                )
+            except RateLimited as err:
+                # The key had budget left, so its actual limit is lower than expected.
+                usage.rate_limited += 1
+                self._evict(key, now + (err.retry_after or KEY_EVICT_RATE_LIMITED), err)
+                error = err
+            except WrongApiKey as err:
+                usage.failures += 1
+                self._evict(key, now + KEY_EVICT_WRONG, err)
+                error = err
+            except CannotConnect:
+                usage.failures += 1
+                raise
+
+    def _evict(self, key: str, until: datetime, error: CannotConnect | WrongApiKey) -> None:
+        _LOGGER.warning(f"API key {mask_key(key)} was rejected, not using it until {until}")
+        self.usage[key].evicted_until = until
+        self._eviction_error = error
+
+    @staticmethod
+    def _update_remaining(usage: KeyUsage, headers: Mapping[str, str]) -> None:
+        for header in RATE_LIMIT_REMAINING_HEADERS:
+            if (value := headers.get(header)) is not None and value.isdigit():
+                usage.remaining, usage.remaining_at = int(value), dt.now()
+                return
+
+    def stats(self) -> dict[str, str]:
+        """Return usage counters of the keys for display."""
+        now = dt.now()
+        return {
+            f"#{num} {mask_key(key)}": (
+                f"{usage.requests} requests, {usage.failures} failed, {usage.rate_limited} rate limited" +
+                (", evicted" if usage.evicted_until and usage.evicted_until > now else "")
+            )
+            for num, (key, usage) in enumerate(self.usage.items(), start=1)
+        }
+
+
+def mask_key(key: str) -> str:
+    return f"{key[:4]}…{key[-4:]}" if len(key) > 12 else "…"
@@ -0,0 +1,59 @@
+"""Measurement of event loop stalls."""
+from __future__ import annotations
+
+import asyncio
+import time
+
+from homeassistant.core import HomeAssistant
+
+from .const import LOOP_MONITOR_INTERVAL, LOOP_STALL_THRESHOLD
+
+
+class LoopMonitor:
+    """Samples the event loop by a timer and measures how late it runs.
+
+    A timer callback delayed by LOOP_STALL_THRESHOLD or more means the loop was blocked (by any code running
+    in it, not only by this integration). The counters are shown on the System information page.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._interval = LOOP_MONITOR_INTERVAL.total_seconds()
+        self._threshold = LOOP_STALL_THRESHOLD.total_seconds()
+        self._expected: float = 0.0
+        self._handle: asyncio.TimerHandle | None = None
+        self.samples: int = 0
+        self.stalls: int = 0
+        self.stalled: float = 0.0
+        self.max_delay: float = 0.0
+
+    def start(self) -> None:
+        """Start sampling the event loop."""
+        if self._handle is None:
+            self._schedule()
+
+    def stop(self) -> None:
+        """Stop sampling the event loop."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self) -> None:
+        self._expected = time.monotonic() + self._interval
+        self._handle = self._hass.loop.call_later(self._interval, self._sample)
+
+    def _sample(self) -> None:
+        delay = max(time.monotonic() - self._expected, 0.0)
+        self.samples += 1
+        self.max_delay = max(self.max_delay, delay)
+        if delay >= self._threshold:
+            self.stalls += 1
+            self.stalled += delay
+        self._schedule()
+
+    def stats(self) -> dict[str, str]:
+        """Return the counters for display."""
+        return {
+            "event_loop_stalls": f"{self.stalls} of {self.samples} samples, {self.stalled * 1000:.0f} ms in total",
+            "event_loop_max_delay": f"{self.max_delay * 1000:.1f} ms",
+        }
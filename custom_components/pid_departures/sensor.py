@@ -7,18 +7,46 @@ from typing import Any
 from zoneinfo import ZoneInfo
 
 from homeassistant.helpers.entity import Entity
-from homeassistant.components.sensor import SensorEntity, SensorDeviceClass
+from homeassistant.components.sensor import SensorEntity, SensorDeviceClass, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_LATITUDE, CONF_LONGITUDE, EntityCategory
-from homeassistant.core import HomeAssistant
+from homeassistant.const import CONF_LATITUDE, CONF_LONGITUDE, PERCENTAGE, EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .const import DOMAIN, ICON_STOP, ICON_LAT, ICON_LON, ICON_ZONE, ICON_PLATFORM, ICON_UPDATE, ROUTE_TYPE_ICON, RouteType
+from .const import (
+    BOARD_SENSOR_MAX_DEPARTURES,
+    CONF_BOARD_SENSOR,
+    DOMAIN,
+    ICON_DELAY,
+    ICON_LAT,
+    ICON_LON,
+    ICON_PLATFORM,
+    ICON_PUNCTUALITY,
+    ICON_STOP,
+    ICON_UPDATE,
+    ICON_ZONE,
+    ROUTE_TYPE_ICON,
+    RouteType,
+)
 from .entity import BaseEntity
-from .hub import DepartureBoard
+from .hub import DepartureBoard, DepartureData
 
 SCAN_INTERVAL = timedelta(seconds=60)
 
+# Fields of departures listed by the board sensor.
+BOARD_SENSOR_COLUMNS = (
+    "route_name",
+    "route_type",
+    "trip_headsign",
+    "departure_time_sched",
+    "departure_time_est",
+    "delay_sec",
+    "is_at_stop",
+    "is_canceled",
+    "stop_platform",
+    "trip_id",
+)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -30,22 +58,54 @@ async def async_setup_entry(
     new_entities: list[Entity] = []
 
     # Set entities for departures
-    for i in range(departure_board.conn_num):
-        new_entities.append(RouteNameSensor(departure_board, i))
-        new_entities.append(DepartureTimeSensor(departure_board, i))
+    if config_entry.data.get(CONF_BOARD_SENSOR, False):
+        new_entities.append(BoardSensor(departure_board))
+    else:
+        for offset in departure_board.walking_offsets:
+            for i in range(departure_board.conn_num):
+                new_entities.append(RouteNameSensor(departure_board, i, offset))
+                new_entities.append(DepartureTimeSensor(departure_board, i, offset))
+
+    # Set statistics entities
+    new_entities.append(PunctualitySensor(departure_board))
+    new_entities.append(AverageDelaySensor(departure_board))
 
     # Set diagnostic entities
     new_entities.append(StopSensor(departure_board))
     new_entities.append(LatSensor(departure_board))
     new_entities.append(LonSensor(departure_board))
     new_entities.append(ZoneSensor(departure_board))
-    if departure_board.platform != "":
-        new_entities.append(PlatformSensor(departure_board))
     new_entities.append(UpdateSensor(departure_board))
 
     # Add all entities to HA
     async_add_entities(new_entities)
 
+    # Whether the stop has a platform is known only once the first data of the board arrive.
+    @callback
+    def async_add_platform_sensor() -> None:
+        departure_board.remove_callback(async_add_platform_sensor)
+        if departure_board.platform != "":
+            async_add_entities([PlatformSensor(departure_board)])
+
+    if departure_board.initialized:
+        async_add_platform_sensor()
+    else:
+        departure_board.register_callback(async_add_platform_sensor)
+        config_entry.async_on_unload(lambda: departure_board.remove_callback(async_add_platform_sensor))
+
+
+def view_sensor_ids(
+    departure_board: DepartureBoard, translation_key: str | None, departure_num: int, walking_offset: int
+) -> tuple[str, dict[str, str]]:
+    """Return unique ID and name placeholders of a departure sensor, distinguishing views of other walking
+    offsets than the main one."""
+    unique_id = f"{departure_board.board_id}_{translation_key}_{departure_num + 1}"
+    num = str(departure_num + 1)
+    if walking_offset != departure_board.walking_offset:
+        unique_id += f"_offset_{walking_offset}"
+        num += f", {walking_offset:+d} min"
+    return unique_id, {"num": num}
+
 
 class RouteNameSensor(BaseEntity, SensorEntity):
     """Sensor for departure route name."""
@@ -53,16 +113,26 @@ class RouteNameSensor(BaseEntity, SensorEntity):
     _attr_translation_key = "route_name"
     _attr_should_poll = False
 
-    def __init__(self, departure_board: DepartureBoard, departure_num: int) -> None:
+    def __init__(self, departure_board: DepartureBoard, departure_num: int, walking_offset: int) -> None:
         super().__init__(departure_board)
         self._departure = departure_num
-        self._attr_unique_id = f"{departure_board.board_id}_{self.translation_key}_{departure_num + 1}"
-        self._attr_translation_placeholders = {"num": str(departure_num + 1)}
+        self._walking_offset = walking_offset
+        self._attr_unique_id, self._attr_translation_placeholders = view_sensor_ids(
+            departure_board, self.translation_key, departure_num, walking_offset
+        )
 
     @property
-    def native_value(self) -> str:
+    def departure(self) -> DepartureData | None:
+        """Departure of the sensor in its view, None if there is none (yet)."""
+        departures = self._departure_board.view_departures(self._walking_offset)
+        return departures[self._departure] if self._departure < len(departures) else None
+
+    @property
+    def native_value(self) -> str | None:
         """ Returns name of the route as state."""
-        return self._departure_board.departures[self._departure].route_name or "?"
+        if self.departure is None:
+            return None
+        return self.departure.route_name or "?"
 
     @property
     def extra_state_attributes(self) -> Mapping[str, Any]:
@@ -70,7 +140,7 @@ class RouteNameSensor(BaseEntity, SensorEntity):
         # NOTE: When CONF_LATITUDE and CONF_LONGITUDE is included, HASS shows
         #  the entity on the map.
         return {
-            **self._departure_board.departures[self._departure].as_dict(),
+            **(self.departure.as_dict() if self.departure else {}),
             CONF_LATITUDE: self._departure_board.latitude,
             CONF_LONGITUDE: self._departure_board.longitude,
         }
@@ -78,7 +148,7 @@ class RouteNameSensor(BaseEntity, SensorEntity):
     @property
     def icon(self) -> str:
         """Returns entity icon based on the type of route"""
-        route_type = self._departure_board.departures[self._departure].route_type
+        route_type = self.departure.route_type if self.departure else RouteType.BUS
         return ROUTE_TYPE_ICON.get(route_type, ROUTE_TYPE_ICON[RouteType.BUS])
 
     async def async_added_to_hass(self) -> None:
@@ -99,20 +169,28 @@ class DepartureTimeSensor(BaseEntity, SensorEntity):
     _attr_should_poll = False
     _attr_device_class = SensorDeviceClass.TIMESTAMP
 
-    def __init__(self, departure_board: DepartureBoard, departure_num: int) -> None:
+    def __init__(self, departure_board: DepartureBoard, departure_num: int, walking_offset: int) -> None:
         super().__init__(departure_board)
         self._departure_num = departure_num
-        self._attr_unique_id = f"{departure_board.board_id}_{self.translation_key}_{departure_num + 1}"
-        self._attr_translation_placeholders = {"num": str(departure_num + 1)}
+        self._walking_offset = walking_offset
+        self._attr_unique_id, self._attr_translation_placeholders = view_sensor_ids(
+            departure_board, self.translation_key, departure_num, walking_offset
+        )
+
+    @property
+    def departure(self) -> DepartureData | None:
+        """Departure of the sensor in its view, None if there is none (yet)."""
+        departures = self._departure_board.view_departures(self._walking_offset)
+        return departures[self._departure_num] if self._departure_num < len(departures) else None
 
     @property
     def native_value(self) -> datetime | None:
-        return self._departure_board.departures[self._departure_num].departure_time_est
+        return self.departure.departure_time_est if self.departure else None
 
     @property
     def icon(self) -> str:
         """Returns entity icon based on the type of route"""
-        route_type = self._departure_board.departures[self._departure_num].route_type
+        route_type = self.departure.route_type if self.departure else RouteType.BUS
         return ROUTE_TYPE_ICON.get(route_type, ROUTE_TYPE_ICON[RouteType.BUS])
 
     async def async_added_to_hass(self):
@@ -126,6 +204,106 @@ class DepartureTimeSensor(BaseEntity, SensorEntity):
         self._departure_board.remove_callback(self.async_write_ha_state)
 
 
+class BoardSensor(BaseEntity, SensorEntity):
+    """Sensor for all departures of the board, an alternative to the pair of sensors per departure.
+
+    The state is the time of the next departure, upcoming departures are listed in attributes in columnar
+    layout (a list per field), which keeps the attributes compact.
+    """
+
+    _attr_translation_key = "departures"
+    _attr_should_poll = False
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _unrecorded_attributes = frozenset(BOARD_SENSOR_COLUMNS)
+
+    @property
+    def native_value(self) -> datetime | None:
+        departures = self._departure_board.departures
+        return departures[0].departure_time_est if departures else None
+
+    @property
+    def extra_state_attributes(self) -> Mapping[str, Any]:
+        """Returns upcoming departures as parallel lists of their fields."""
+        departures = self._departure_board.departures[:BOARD_SENSOR_MAX_DEPARTURES]
+        return {
+            **{column: [getattr(dep, column) for dep in departures] for column in BOARD_SENSOR_COLUMNS},
+            CONF_LATITUDE: self._departure_board.latitude,
+            CONF_LONGITUDE: self._departure_board.longitude,
+        }
+
+    @property
+    def icon(self) -> str:
+        """Returns entity icon based on the type of the next route"""
+        departures = self._departure_board.departures
+        route_type = departures[0].route_type if departures else RouteType.BUS
+        return ROUTE_TYPE_ICON.get(route_type, ROUTE_TYPE_ICON[RouteType.BUS])
+
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        self._departure_board.register_callback(self.async_write_ha_state)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        self._departure_board.remove_callback(self.async_write_ha_state)
+
+
+class PunctualitySensor(BaseEntity, SensorEntity):
+    """Sensor for the share of departures on time, computed from the delay history."""
+
+    _attr_translation_key = "punctuality"
+    _attr_icon = ICON_PUNCTUALITY
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_should_poll = False
+
+    @property
+    def native_value(self) -> float | None:
+        return self._departure_board.history.total.punctuality
+
+    @property
+    def extra_state_attributes(self) -> Mapping[str, Any]:
+        """Returns punctuality per route."""
+        return {route: stats.punctuality for route, stats in self._departure_board.history.route_stats.items()
+                if stats.count > 0}
+
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        self._departure_board.register_callback(self.async_write_ha_state)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        self._departure_board.remove_callback(self.async_write_ha_state)
+
+
+class AverageDelaySensor(BaseEntity, SensorEntity):
+    """Sensor for the average delay of departures, computed from the delay history."""
+
+    _attr_translation_key = "average_delay"
+    _attr_icon = ICON_DELAY
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.SECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_should_poll = False
+
+    @property
+    def native_value(self) -> float | None:
+        return self._departure_board.history.total.average_delay
+
+    @property
+    def extra_state_attributes(self) -> Mapping[str, Any]:
+        """Returns average delay per route."""
+        return {route: stats.average_delay for route, stats in self._departure_board.history.route_stats.items()
+                if stats.count > 0}
+
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        self._departure_board.register_callback(self.async_write_ha_state)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        self._departure_board.remove_callback(self.async_write_ha_state)
+
+
 class StopSensor(BaseEntity, SensorEntity):
     """Sensor for stop name."""
 
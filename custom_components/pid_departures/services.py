@@ -0,0 +1,206 @@
+"""Services of the PID Departures integration."""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, cast
+
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt
+import voluptuous as vol
+
+from .const import (
+    ATTR_LIMIT,
+    ATTR_OFFSET,
+    ATTR_ROUTE_NAMES,
+    ATTR_ROUTE_TYPES,
+    ATTR_STOPS,
+    ATTR_TRIP_ID,
+    DATA_KEY_POOL,
+    DATA_TRIPS,
+    DEPARTURES_CACHE_TTL,
+    DOMAIN,
+    SERVICE_GET_DEPARTURES,
+    SERVICE_TRACK_TRIP,
+    SERVICE_UNTRACK_TRIP,
+    TRIP_TRACKING_MAX_STOPS,
+    RouteType,
+)
+from .catalogue import get_catalogue, parse_asw_id
+from .columnar import DepartureColumns, decode_departures, decode_parts
+from .dep_board_api import PIDDepartureBoardAPI
+from .errors import StopNotFound
+from .hub import DepartureBoard, DepartureData
+from .keypool import ApiKeyPool
+from .trips import TripTracker
+
+TRACK_TRIP_SCHEMA = vol.Schema({
+    vol.Required(ATTR_TRIP_ID): cv.string,
+    vol.Optional(ATTR_STOPS, default=list): vol.All(cv.ensure_list, [cv.string]),
+})
+
+GET_DEPARTURES_SCHEMA = vol.Schema({
+    vol.Required(ATTR_STOPS): vol.All(cv.ensure_list, [cv.string], vol.Length(min=1)),
+    vol.Optional(ATTR_LIMIT, default=5): vol.All(vol.Coerce(int), vol.Range(1, PIDDepartureBoardAPI.MAX_LIMIT)),
+    vol.Optional(ATTR_OFFSET, default=0): vol.All(vol.Coerce(int), vol.Range(-30, 4320)),
+    vol.Optional(ATTR_ROUTE_NAMES): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_ROUTE_TYPES): vol.All(cv.ensure_list, [vol.Coerce(RouteType)]),
+})
+
+UNTRACK_TRIP_SCHEMA = vol.Schema({
+    vol.Required(ATTR_TRIP_ID): cv.string,
+})
+
+
+class DepartureQuery:
+    """Query of the get_departures service."""
+
+    def __init__(self, data: dict[str, Any], now: datetime) -> None:
+        self.limit: int = data[ATTR_LIMIT]
+        self.offset: int = data[ATTR_OFFSET]
+        self.start = now + timedelta(minutes=self.offset)
+        self.route_names: set[str] | None = set(data[ATTR_ROUTE_NAMES]) if ATTR_ROUTE_NAMES in data else None
+        self.route_types: set[RouteType] | None = set(data[ATTR_ROUTE_TYPES]) if ATTR_ROUTE_TYPES in data else None
+
+    @property
+    def has_filters(self) -> bool:
+        return self.route_names is not None or self.route_types is not None
+
+    def select(self, departures: Iterable[DepartureData]) -> list[DepartureData]:
+        """Return departures matching the query."""
+        return [
+            dep for dep in departures
+            if ((time := dep.departure_time_est or dep.arrival_time_est) is None or time >= self.start)
+            and (self.route_names is None or dep.route_name in self.route_names)
+            and (self.route_types is None or dep.route_type in self.route_types)
+        ][:self.limit]
+
+    def select_columns(self, departures: DepartureColumns) -> list[DepartureData]:
+        """Return departures matching the query from a columnar store, materializing only the selected ones."""
+        start = self.start.timestamp()
+        rows = (
+            idx for idx in range(len(departures))
+            if ((instant := departures.instant(idx)) is None or instant >= start)
+            and (self.route_names is None or departures.text(idx, "route_name") in self.route_names)
+            and (self.route_types is None or departures.text(idx, "route_type") in self.route_types)
+        )
+        return [departures[idx] for idx in islice(rows, self.limit)]
+
+    def answer_from_cache(self, board: DepartureBoard, now: datetime) -> list[DepartureData] | None:
+        """Return matching departures from the board if it has fresh and sufficient data, None otherwise."""
+        if board.updated is None or now - board.updated > DEPARTURES_CACHE_TTL or board.walking_offset > self.offset:
+            return None
+        selected = self.select(board.departures)
+        # The board has all departures in its range if it got fewer than it asked for.
+        if len(selected) < self.limit and len(board.departures) >= board.conn_num:
+            return None
+        return selected
+
+
+async def async_get_departures(hass: HomeAssistant, stops: list[str], query: DepartureQuery) -> dict[str, Any]:
+    """Return departures from the stops, from fresh data of the boards or with a single batched request."""
+    now = dt.now()
+    boards: dict[str, DepartureBoard] = {board.board_id: board for board in hass.data.get(DOMAIN, {}).values()}
+    result: dict[str, tuple[str, list[DepartureData]]] = {}
+    for asw_id in stops:
+        if (board := boards.get(asw_id)) and (departures := query.answer_from_cache(board, now)) is not None:
+            result[asw_id] = (board.stop_name, departures)
+
+    if missing := [asw_id for asw_id in stops if asw_id not in result]:
+        key_pool: ApiKeyPool = hass.data[DATA_KEY_POOL]
+        time_before = timedelta(minutes=-query.offset)
+        limit = PIDDepartureBoardAPI.MAX_LIMIT if query.has_filters else query.limit * len(missing)
+        # Departures are decoded to columnar stores in the same place the response is parsed (off the event loop
+        # for large responses), the query is evaluated on the stores.
+        data = await key_pool.async_fetch_data(missing, limit, time_before=time_before, decode=decode_parts)
+        truncated = data["count"] >= min(limit, PIDDepartureBoardAPI.MAX_LIMIT)
+        by_stop: dict[str, dict[str, Any]] = data["parts"]
+        for asw_id in missing:
+            if (stop_data := by_stop.get(asw_id)) is None:
+                raise StopNotFound(f"Stop {asw_id} was not found by the API")
+            departures = query.select_columns(stop_data["departures"])
+            # Other stops of a truncated response may have taken the place of departures of this one.
+            if len(departures) < query.limit and truncated and len(missing) > 1:
+                stop_data = await key_pool.async_fetch_data(
+                    asw_id, limit if query.has_filters else query.limit, time_before=time_before,
+                    decode=decode_departures,
+                )
+                departures = query.select_columns(stop_data["departures"])
+            result[asw_id] = (stop_data["stops"][0]["stop_name"], departures)
+
+    return {
+        ATTR_STOPS: {
+            asw_id: {
+                "stop_name": stop_name,
+                "departures": [_serialize(dep) for dep in departures],
+            }
+            for asw_id in stops
+            for stop_name, departures in (result[asw_id],)
+        }
+    }
+
+
+async def async_trip_stops(hass: HomeAssistant, trip_id: str, target: str | None) -> list[str]:
+    """Return the stops a trip is tracked over, fetched from the GTFS trip in the API.
+
+    These are the last TRIP_TRACKING_MAX_STOPS stops of the trip up to the target stop, the terminus of the trip
+    if no target is given.
+    """
+    key_pool: ApiKeyPool = hass.data[DATA_KEY_POOL]
+    try:
+        trip = await key_pool.async_fetch_trip(trip_id)
+    except StopNotFound:
+        raise HomeAssistantError(f"Trip {trip_id} was not found by the API") from None
+    stops = [
+        asw_id for feature in trip.get("stops") or []
+        if (asw_id := parse_asw_id((feature.get("properties") or {}).get("asw_id"))) is not None
+    ]
+    if not stops:
+        raise HomeAssistantError(f"Stops of trip {trip_id} are not known, list them in stops")
+    if target is not None:
+        if target not in stops:
+            raise HomeAssistantError(f"Trip {trip_id} does not stop at {target}")
+        stops = stops[:stops.index(target) + 1]
+    return stops[-TRIP_TRACKING_MAX_STOPS:]
+
+
+def _serialize(departure: DepartureData) -> dict[str, Any]:
+    return {key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in departure.as_dict().items()}
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register services of the integration."""
+    key_pool = hass.data[DATA_KEY_POOL] = ApiKeyPool()
+    tracker = hass.data[DATA_TRIPS] = TripTracker(hass, key_pool)
+
+    async def async_track_trip(call: ServiceCall) -> None:
+        catalogue = get_catalogue(hass)
+        stops = [await catalogue.async_resolve(stop) for stop in call.data[ATTR_STOPS]]
+        if not hass.data[DATA_KEY_POOL].keys:
+            raise HomeAssistantError("No departure board is configured")
+        if len(stops) < 2:
+            # Without the stops before the target, they are taken from the timetable of the trip.
+            stops = await async_trip_stops(hass, call.data[ATTR_TRIP_ID], stops[0] if stops else None)
+        await tracker.async_track(call.data[ATTR_TRIP_ID], stops)
+
+    async def async_untrack_trip(call: ServiceCall) -> None:
+        tracker.untrack(call.data[ATTR_TRIP_ID])
+
+    async def async_get_departures_service(call: ServiceCall) -> ServiceResponse:
+        catalogue = get_catalogue(hass)
+        stops = list(dict.fromkeys([await catalogue.async_resolve(stop) for stop in call.data[ATTR_STOPS]]))
+        return cast(ServiceResponse, await async_get_departures(hass, stops, DepartureQuery(call.data, dt.now())))
+
+    hass.services.async_register(DOMAIN, SERVICE_TRACK_TRIP, async_track_trip, schema=TRACK_TRIP_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_UNTRACK_TRIP, async_untrack_trip, schema=UNTRACK_TRIP_SCHEMA)
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_DEPARTURES,
+        async_get_departures_service,
+        schema=GET_DEPARTURES_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
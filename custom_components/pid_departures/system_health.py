@@ -2,6 +2,10 @@
 from homeassistant.components import system_health
 from homeassistant.core import HomeAssistant, callback
 
+from .const import DATA_KEY_POOL, DATA_LOOP_MONITOR
+from .keypool import ApiKeyPool
+from .loopmonitor import LoopMonitor
+
 @callback
 def async_register(
     hass: HomeAssistant, register: system_health.SystemHealthRegistration
@@ -12,8 +16,12 @@ def async_register(
 
 async def system_health_info(hass):
     """Get info for the info page."""
+    key_pool: ApiKeyPool | None = hass.data.get(DATA_KEY_POOL)
+    monitor: LoopMonitor | None = hass.data.get(DATA_LOOP_MONITOR)
     return {
         "api_endpoint_reachable": system_health.async_check_can_reach_url(
             hass, "https://api.golemio.cz/"
-        )
+        ),
+        **({f"API key {key}": usage for key, usage in key_pool.stats().items()} if key_pool else {}),
+        **(monitor.stats() if monitor else {}),
     }
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""In-memory timeline of prefetched departures used for calendar range queries."""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator, Sequence
+from datetime import datetime
+from itertools import chain, pairwise
+from operator import itemgetter
+from typing import TYPE_CHECKING
+
+from .columnar import DepartureColumns
+
+if TYPE_CHECKING:
+    from .hub import DepartureData
+
+
+class DepartureTimeline:
+    """Departures of a single board sorted by their estimated time.
+
+    The timeline is filled by range refreshes: each refresh replaces the part of the timeline
+    between its start and end with fresh departures, everything else is kept. Queries are answered
+    by binary search, so they never touch the network. Departures are kept in columnar storage
+    and only those returned by queries are materialized.
+    """
+
+    def __init__(self) -> None:
+        self._instants = array("q")
+        self._departures = DepartureColumns()
+        self.start: datetime | None = None
+        self.end: datetime | None = None
+        self.full_refreshed: datetime | None = None
+        self.near_refreshed: datetime | None = None
+
+    def __len__(self) -> int:
+        return len(self._departures)
+
+    def merge(self, departures: DepartureColumns, start: datetime, end: datetime) -> None:
+        """Replace departures between start and end (inclusive) with the given ones.
+
+        The timeline is joined from slices of the kept and the fresh columns, departures are not copied one by one.
+        """
+        fresh, fresh_instants = _sort(departures)
+        fresh_keys = {fresh.key(idx) for idx in range(len(fresh))}
+        current, instants = self._departures, self._instants
+        lo = bisect_left(instants, int(start.timestamp()))
+        hi = bisect_right(instants, int(end.timestamp()))
+        # Departures are dropped also by key, a delayed trip may have moved out of the refreshed range.
+        dropped = current.find(fresh_keys, chain(range(lo), range(hi, len(current))))
+        ranges = _split([(0, lo), (hi, len(current))], dropped)
+        kept = DepartureColumns.concat((current, first, last) for first, last in ranges)
+        kept_instants = array("q")
+        for first, last in ranges:
+            kept_instants.extend(instants[first:last])
+
+        runs = list(_merge_runs(kept_instants, fresh_instants))
+        sources = ((kept, kept_instants), (fresh, fresh_instants))
+        self._departures = DepartureColumns.concat((sources[which][0], first, last) for which, first, last in runs)
+        self._instants = array("q")
+        for which, first, last in runs:
+            self._instants.extend(sources[which][1][first:last])
+
+        self.start = start if self.start is None else min(self.start, start)
+        self.end = end if self.end is None else max(self.end, end)
+
+    def prune(self, before: datetime) -> None:
+        """Drop departures earlier than the given moment."""
+        idx = bisect_left(self._instants, int(before.timestamp()))
+        if idx:
+            del self._instants[:idx]
+            self._departures = DepartureColumns.concat([(self._departures, idx, len(self._departures))])
+        if self.start is not None and self.start < before:
+            self.start = before
+
+    def between(self, start: datetime, end: datetime, limit: int | None = None) -> Sequence[DepartureData]:
+        """Return departures between start and end (inclusive) sorted from earliest to latest."""
+        lo = bisect_left(self._instants, int(start.timestamp()))
+        hi = bisect_right(self._instants, int(end.timestamp()))
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return self._departures[lo:hi]
+
+
+def _sort(departures: DepartureColumns) -> tuple[DepartureColumns, array[int]]:
+    """Return departures with a known time sorted by it, along with their times."""
+    rows = [(instant, idx) for idx in range(len(departures)) if (instant := departures.instant(idx)) is not None]
+    instants = array("q", (instant for instant, _ in rows))
+    # Responses of the API are sorted already, they are copied only if not.
+    if len(rows) == len(departures) and all(a <= b for a, b in pairwise(instants)):
+        return departures, instants
+    rows.sort(key=itemgetter(0))
+    return (DepartureColumns.gather((departures, idx) for _, idx in rows),
+            array("q", (instant for instant, _ in rows)))
+
+
+def _split(ranges: list[tuple[int, int]], dropped: list[int]) -> list[tuple[int, int]]:
+    """Return the ranges of indexes without the dropped ones (both sorted)."""
+    result: list[tuple[int, int]] = []
+    drop = iter(dropped)
+    idx = next(drop, None)
+    for first, last in ranges:
+        while idx is not None and idx < last:
+            if first < idx:
+                result.append((first, idx))
+            first = idx + 1
+            idx = next(drop, None)
+        if first < last:
+            result.append((first, last))
+    return result
+
+
+def _merge_runs(first: array[int], second: array[int]) -> Iterator[tuple[int, int, int]]:
+    """Yield runs (0 for the first or 1 for the second array, start, stop) merging two sorted arrays,
+    equal values of the first array go first."""
+    i = j = 0
+    while i < len(first) and j < len(second):
+        if first[i] <= second[j]:
+            stop = bisect_right(first, second[j], i)
+            yield 0, i, stop
+            i = stop
+        else:
+            stop = bisect_left(second, first[i], j)
+            yield 1, j, stop
+            j = stop
+    if i < len(first):
+        yield 0, i, len(first)
+    if j < len(second):
+        yield 1, j, len(second)
@@ -0,0 +1,146 @@
+"""Point-in-time triggers of departures of a board."""
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime
+import logging
+from typing import TYPE_CHECKING, Any
+
+from attrs import define
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt
+
+from .columnar import DepartureColumns
+from .const import DATA_TRIGGER_LEADS, DEPARTURE_TRIGGER_THRESHOLD, DOMAIN, EVENT_DEPARTURE
+
+if TYPE_CHECKING:
+    from .hub import DepartureData
+
+_LOGGER = logging.getLogger(__name__)
+
+TRIGGER_DEPARTURE_IN = "departure_in"
+TRIGGER_AT_STOP = "at_stop"
+
+DepartureKey = tuple[str | None, int]
+
+
+def register_lead_time(hass: HomeAssistant, entry_id: str, minutes: int) -> CALLBACK_TYPE:
+    """Request departure_in events the given number of minutes before departures of the board of the entry."""
+    counter: Counter[int] = hass.data.setdefault(DATA_TRIGGER_LEADS, {}).setdefault(entry_id, Counter())
+    counter[minutes] += 1
+
+    @callback
+    def remove() -> None:
+        counter[minutes] -= 1
+        if counter[minutes] <= 0:
+            del counter[minutes]
+
+    return remove
+
+
+@define
+class _Timer:
+    when: datetime
+    cancel: CALLBACK_TYPE
+    departures: DepartureColumns
+    idx: int
+
+
+class DepartureTriggers:
+    """Fires events at the moments departures of a board are due, instead of evaluating templates periodically.
+
+    A timer is scheduled for each fetched departure and each lead time requested by an attached trigger, at its
+    estimated departure time minus the lead time. Timers are re-armed only when the estimate moves
+    by more than DEPARTURE_TRIGGER_THRESHOLD. Arrival of a vehicle at the stop is fired when the departure is first
+    seen with is_at_stop.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, board_id: str) -> None:
+        self._hass = hass
+        self._entry_id = entry_id
+        self._board_id = board_id
+        self._timers: dict[tuple[DepartureKey, int], _Timer] = {}
+        self._fired: set[tuple[DepartureKey, int]] = set()
+        self._at_stop: set[DepartureKey] | None = None
+
+    @property
+    def lead_times(self) -> set[int]:
+        """Minutes before departures departure_in events are fired at, as requested by the attached triggers."""
+        return set(self._hass.data.get(DATA_TRIGGER_LEADS, {}).get(self._entry_id, ()))
+
+    def update(self, departures: DepartureColumns, now: datetime) -> None:
+        """Re-arm timers for fresh departures of the board."""
+        lead_times = self.lead_times
+        current: set[tuple[DepartureKey, int]] = set()
+        at_stop: set[DepartureKey] = set()
+        for idx in range(len(departures)):
+            key = departures.key(idx)
+            if departures.flag(idx, "is_at_stop"):
+                at_stop.add(key)
+                # Vehicles already at the stop on the first update are not reported.
+                if self._at_stop is not None and key not in self._at_stop:
+                    self._fire(TRIGGER_AT_STOP, departures[idx])
+
+            if (departure := departures.epoch(idx, "departure_time_est")) is None:
+                continue
+            for minutes in lead_times:
+                timer_key = (key, minutes)
+                current.add(timer_key)
+                if timer_key in self._fired:
+                    continue
+                when = dt.utc_from_timestamp(departure - minutes * 60)
+                timer = self._timers.get(timer_key)
+                if timer is not None:
+                    if abs(when - timer.when) <= DEPARTURE_TRIGGER_THRESHOLD:
+                        timer.departures, timer.idx = departures, idx
+                        continue
+                    timer.cancel()
+                    del self._timers[timer_key]
+                    if when <= now:
+                        # The departure moved earlier past the moment of an armed trigger, it is fired late.
+                        self._fired.add(timer_key)
+                        self._fire(TRIGGER_DEPARTURE_IN, departures[idx], minutes)
+                        continue
+                if when > now:
+                    self._arm(timer_key, when, departures, idx)
+
+        self._at_stop = at_stop
+        for timer_key in [timer_key for timer_key in self._timers if timer_key not in current]:
+            self._timers.pop(timer_key).cancel()
+        self._fired &= current
+
+    def _arm(self, timer_key: tuple[DepartureKey, int], when: datetime, departures: DepartureColumns, idx: int) -> None:
+        @callback
+        def async_fire(_: datetime) -> None:
+            timer = self._timers.pop(timer_key)
+            self._fired.add(timer_key)
+            self._fire(TRIGGER_DEPARTURE_IN, timer.departures[timer.idx], timer_key[1])
+
+        self._timers[timer_key] = _Timer(
+            when, async_track_point_in_utc_time(self._hass, async_fire, when), departures, idx
+        )
+
+    def cancel(self) -> None:
+        """Cancel all timers."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+    def _fire(self, trigger_type: str, departure: DepartureData, minutes: int | None = None) -> None:
+        data: dict[str, Any] = {
+            "entry_id": self._entry_id,
+            "board_id": self._board_id,
+            "type": trigger_type,
+            "trip_id": departure.trip_id,
+            "route_name": departure.route_name,
+            "trip_headsign": departure.trip_headsign,
+            "departure_time_est": departure.departure_time_est.isoformat() if departure.departure_time_est else None,
+            "delay_sec": departure.delay_sec,
+            "stop_platform": departure.stop_platform,
+        }
+        if minutes is not None:
+            data["minutes"] = minutes
+        self._hass.bus.async_fire(EVENT_DEPARTURE, data)
+        _LOGGER.debug(f"{DOMAIN}: departure {trigger_type} on {self._board_id}, {data}")
@@ -0,0 +1,175 @@
+"""Tracking of trips across their downstream stops."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+import logging
+from typing import Any
+
+from attrs import define, field
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import dt
+
+from .const import (
+    DOMAIN,
+    EVENT_TRIP,
+    TRIP_TRACKING_INTERVAL,
+    TRIP_TRACKING_MARGIN,
+    TRIP_TRACKING_MISSES,
+    TRIP_TRACKING_TIMEOUT,
+    TRIP_TRACKING_WINDOW,
+)
+from .columnar import DepartureColumns, decode_parts
+from .dep_board_api import PIDDepartureBoardAPI
+from .errors import CannotConnect, StopNotFound, WrongApiKey
+from .hub import DepartureData
+from .keypool import ApiKeyPool
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@define(kw_only=True)
+class TrackedTrip:
+    """A trip followed across stops, the last one of them is the target stop."""
+
+    trip_id: str
+    stops: list[str]
+    started: datetime
+    seen: set[str] = field(factory=set)
+    stops_away: int | None = None
+    at_target: bool = False
+    # Responses in a row the trip was missing from at the target stop after it had been seen there.
+    misses: int = 0
+
+    @property
+    def target(self) -> str:
+        return self.stops[-1]
+
+
+class TripTracker:
+    """Follows trips across their downstream stops.
+
+    Stops of all tracked trips are fetched in a single request per tick. Departures of the tracked trips are
+    indexed by trip ID and stop, and each trip is dropped once it has passed its target stop. The tracker
+    polls only while there are tracked trips.
+    """
+
+    def __init__(self, hass: HomeAssistant, key_pool: ApiKeyPool) -> None:
+        self._hass = hass
+        self._key_pool = key_pool
+        self._trips: dict[str, TrackedTrip] = {}
+        self.matches: dict[str, dict[str, DepartureData]] = {}
+        self._unsub: CALLBACK_TYPE | None = None
+
+    @property
+    def trips(self) -> dict[str, TrackedTrip]:
+        return self._trips
+
+    async def async_track(self, trip_id: str, stops: list[str]) -> None:
+        """Start tracking the trip over the stops (in the order of the trip), the last one is the target."""
+        self._trips[trip_id] = TrackedTrip(trip_id=trip_id, stops=stops, started=dt.now())
+        if self._unsub is None:
+            self._unsub = async_track_time_interval(self._hass, self.async_tick, TRIP_TRACKING_INTERVAL)
+        await self.async_tick()
+
+    def untrack(self, trip_id: str) -> None:
+        """Stop tracking the trip."""
+        self._trips.pop(trip_id, None)
+        self.matches.pop(trip_id, None)
+        if not self._trips and self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    async def async_tick(self, now: datetime | None = None) -> None:
+        """Fetch departures of all tracked trips and report their progress."""
+        now = now or dt.now()
+        for trip in [trip for trip in self._trips.values() if now - trip.started > TRIP_TRACKING_TIMEOUT]:
+            self._fire(trip, "lost")
+            self.untrack(trip.trip_id)
+        if not self._trips:
+            return
+
+        trips = list(self._trips.values())
+        try:
+            data = await self._key_pool.async_fetch_data(
+                sorted({stop for trip in trips for stop in trip.stops}),
+                PIDDepartureBoardAPI.MAX_LIMIT,
+                time_before=TRIP_TRACKING_MARGIN,
+                time_after=self._time_after(trips, now),
+                decode=decode_parts,
+            )
+        except (CannotConnect, StopNotFound, WrongApiKey) as err:
+            _LOGGER.warning(f"Failed to fetch departures of tracked trips: {err!r}")
+            return
+        if data["count"] >= PIDDepartureBoardAPI.MAX_LIMIT:
+            # Tracked trips may be missing only because the response is truncated.
+            _LOGGER.debug(f"{DOMAIN}: skipping truncated response for tracked trips")
+            return
+
+        # Only departures of the tracked trips are materialized.
+        index: dict[str, dict[str, DepartureData]] = {}
+        for asw_id, stop_data in data["parts"].items():
+            departures: DepartureColumns = stop_data["departures"]
+            for idx in range(len(departures)):
+                trip_id = departures.text(idx, "trip_id")
+                if trip_id is not None and trip_id in self._trips:
+                    index.setdefault(trip_id, {})[asw_id] = departures[idx]
+        for trip in trips:
+            self._update(trip, index.get(trip.trip_id, {}), now)
+
+    def _time_after(self, trips: list[TrackedTrip], now: datetime) -> timedelta:
+        """Return the window needed to see all the trips at their target stops."""
+        expected: list[datetime] = []
+        for trip in trips:
+            target = self.matches.get(trip.trip_id, {}).get(trip.target)
+            if target is None or (time := target.departure_time_est or target.arrival_time_est) is None:
+                return TRIP_TRACKING_WINDOW
+            expected.append(time)
+        return min(TRIP_TRACKING_WINDOW, max(max(expected) - now, timedelta(0)) + TRIP_TRACKING_MARGIN)
+
+    def _update(self, trip: TrackedTrip, matches: dict[str, DepartureData], now: datetime) -> None:
+        if trip.target not in matches and trip.target in trip.seen:
+            # A trip may be missing from a single response, it has passed the target stop when it keeps missing
+            # or when its last known departure from there is past. Until then the last matches are kept.
+            trip.misses += 1
+            target = self.matches.get(trip.trip_id, {}).get(trip.target)
+            time = target.departure_time_est or target.arrival_time_est if target is not None else None
+            if trip.misses >= TRIP_TRACKING_MISSES or (time is not None and time < now):
+                self._fire(trip, "passed")
+                self.untrack(trip.trip_id)
+            return
+
+        # The match index is kept until the next tick, it is used to narrow the window of the request.
+        self.matches[trip.trip_id] = matches
+        trip.seen.update(matches)
+        trip.misses = 0
+        if trip.target not in matches:
+            return
+
+        # Stops the trip has already passed are not requested anymore.
+        trip.stops = [stop for stop in trip.stops if stop in matches or stop not in trip.seen]
+        # Stops still to be passed before the target stop.
+        stops_away = sum(1 for stop in trip.stops[:-1] if stop in matches)
+        at_target = matches[trip.target].is_at_stop
+        if stops_away != trip.stops_away or at_target != trip.at_target:
+            trip.stops_away, trip.at_target = stops_away, at_target
+            self._fire(trip, "progress", matches[trip.target])
+
+    def _fire(self, trip: TrackedTrip, event_type: str, departure: DepartureData | None = None) -> None:
+        data: dict[str, Any] = {
+            "type": event_type,
+            "trip_id": trip.trip_id,
+            "target_stop": trip.target,
+            "stops_away": trip.stops_away if event_type == "progress" else None,
+        }
+        if departure is not None:
+            data.update({
+                "route_name": departure.route_name,
+                "departure_time_est": departure.departure_time_est.isoformat() if departure.departure_time_est else None,
+                "delay_sec": departure.delay_sec,
+                "is_at_stop": departure.is_at_stop,
+                "last_stop_name": departure.last_stop_name,
+            })
+        self._hass.bus.async_fire(EVENT_TRIP, data)
+        _LOGGER.debug(f"{DOMAIN}: trip {trip.trip_id} {event_type}, {data}")
@@ -0,0 +1,116 @@
+"""Batched first refresh of departure boards."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+import logging
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .columnar import decode_parts
+from .const import DOMAIN, WARMUP_DELAY, WARMUP_MAX_STOPS
+from .dep_board_api import PIDDepartureBoardAPI
+from .errors import CannotConnect, StopNotFound, WrongApiKey
+from .hub import DepartureBoard
+from .keypool import ApiKeyPool
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class BoardWarmUp:
+    """Fetches the first data of boards set up at the same time (e.g. after a restart) in batched requests.
+
+    Boards added within WARMUP_DELAY of each other are fetched together, with a request per WARMUP_MAX_STOPS
+    stops of boards with the same earliest walking offset, each with the largest limit the API allows. Boards
+    which did not get all their departures from a truncated response are fetched in another batch, boards whose
+    stop was not found are updated on their own. Failures are only logged, the boards are refreshed again by
+    their regular updates.
+    """
+
+    def __init__(self, hass: HomeAssistant, key_pool: ApiKeyPool) -> None:
+        self._hass = hass
+        self._key_pool = key_pool
+        self._pending: list[DepartureBoard] = []
+        self._unsub: CALLBACK_TYPE | None = None
+
+    def add(self, board: DepartureBoard) -> None:
+        """Schedule the first refresh of the board."""
+        self._pending.append(board)
+        if self._unsub is None:
+            self._unsub = async_call_later(self._hass, WARMUP_DELAY, self._async_start)
+
+    @callback
+    def _async_start(self, _: datetime) -> None:
+        self._unsub = None
+        boards, self._pending = self._pending, []
+        self._hass.async_create_background_task(self.async_warm_up(boards), f"{DOMAIN} warm-up")
+
+    def discard(self, board: DepartureBoard) -> None:
+        """Remove the board from the scheduled warm-up (e.g. when its entry is unloaded)."""
+        if board in self._pending:
+            self._pending.remove(board)
+
+    def cancel(self) -> None:
+        """Cancel the scheduled warm-up."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._pending = []
+
+    async def async_warm_up(self, boards: list[DepartureBoard]) -> None:
+        """Refresh the boards with as few requests as possible."""
+        groups: dict[int, list[DepartureBoard]] = {}
+        for board in boards:
+            groups.setdefault(min(board.walking_offsets), []).append(board)
+        await asyncio.gather(*(
+            self._async_warm_up_batch(offset, group[i:i + WARMUP_MAX_STOPS])
+            for offset, group in groups.items()
+            for i in range(0, len(group), WARMUP_MAX_STOPS)
+        ))
+
+    async def _async_warm_up_batch(self, walking_offset: int, boards: list[DepartureBoard]) -> None:
+        while boards:
+            stops = list(dict.fromkeys(board.board_id for board in boards))
+            limit = PIDDepartureBoardAPI.MAX_LIMIT
+            try:
+                data = await self._key_pool.async_fetch_data(
+                    stops, limit, time_before=timedelta(minutes=-walking_offset), decode=decode_parts
+                )
+            except StopNotFound:
+                # One of the stops is not valid, the others are updated on their own.
+                await asyncio.gather(*(self._async_update(board) for board in boards))
+                return
+            except (CannotConnect, WrongApiKey) as err:
+                _LOGGER.error(f"Failed to fetch first departures of {', '.join(stops)}: {err!r}")
+                return
+
+            # Departures of other stops of a truncated response may have taken the place of some board's ones.
+            truncated = len(stops) > 1 and data["count"] >= limit
+            parts: dict[str, dict[str, Any]] = data["parts"]
+            fallback: list[DepartureBoard] = []
+            short: list[DepartureBoard] = []
+            for board in boards:
+                if (part := parts.get(board.board_id)) is None:
+                    fallback.append(board)
+                elif not await board.async_seed(part, truncated):
+                    short.append(board)
+            await asyncio.gather(*(self._async_update(board) for board in fallback))
+
+            if short and len(short) == len(boards):
+                # None of the boards was filled, their stops are fetched in two smaller batches.
+                half = len(short) // 2
+                await asyncio.gather(
+                    self._async_warm_up_batch(walking_offset, short[:half]),
+                    self._async_warm_up_batch(walking_offset, short[half:]),
+                )
+                return
+            boards = short
+
+    @staticmethod
+    async def _async_update(board: DepartureBoard) -> None:
+        try:
+            await board.async_update()
+        except (CannotConnect, StopNotFound, WrongApiKey) as err:
+            _LOGGER.error(f"Failed to fetch first departures of {board.board_id}: {err!r}")
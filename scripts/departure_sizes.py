@@ -0,0 +1,85 @@
+"""Sizes of departures of a board, as written to the state machine and as kept in memory.
+
+Compares a board with 10 departures shown by a pair of sensors per departure with the same board using
+the single board sensor (entities, state writes and attribute bytes per update, serialized with the Home
+Assistant JSON encoder), and memory taken by 1000-departure responses kept in the columnar store and as
+DepartureData objects (measured by tracemalloc).
+
+Run from the repository root with Home Assistant installed:
+
+    python scripts/departure_sizes.py
+"""
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+import sys
+import tracemalloc
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from homeassistant.helpers.json import json_bytes  # noqa: E402
+
+from custom_components.pid_departures.columnar import DepartureColumns  # noqa: E402
+from custom_components.pid_departures.hub import DepartureBoard, DepartureData  # noqa: E402
+from custom_components.pid_departures.sensor import (  # noqa: E402
+    BoardSensor,
+    DepartureTimeSensor,
+    RouteNameSensor,
+)
+from loop_stall_load import departure  # noqa: E402
+
+DEPARTURES = 10
+RESPONSES = 20
+RESPONSE_DEPARTURES = 1000
+STOP = {
+    "stop_id": "U1Z1P", "asw_id": {"node": 1, "stop": 1}, "stop_name": "Malostranské náměstí", "platform_code": "A",
+    "stop_lat": 50.08, "stop_lon": 14.40, "zone_id": "P", "wheelchair_boarding": 1,
+}
+
+
+def written_bytes(entity: RouteNameSensor | DepartureTimeSensor | BoardSensor) -> int:
+    """Return the size of the state and attributes of the entity."""
+    state = entity.native_value
+    attributes = entity.extra_state_attributes if not isinstance(entity, DepartureTimeSensor) else {}
+    return len(json_bytes({"state": state, "attributes": attributes}))
+
+
+async def compare_entities() -> None:
+    board = DepartureBoard(MagicMock(), "key", "1_1", DEPARTURES, entry_id="entry")
+    board.publish_updates = lambda: asyncio.sleep(0)  # type: ignore[method-assign]
+    board.async_save_history = lambda: asyncio.sleep(0)  # type: ignore[method-assign]
+    await board.async_seed({"stops": [STOP], "infotexts": [], "departures": [departure(i) for i in range(DEPARTURES)]})
+
+    slots = [
+        sensor(board, num, 0) for num in range(DEPARTURES) for sensor in (RouteNameSensor, DepartureTimeSensor)
+    ]
+    board_sensor = BoardSensor(board)
+    print(f"departure entities per board: {len(slots)} -> 1")
+    print(f"state writes per update: {len(slots)} -> 1")
+    print(f"bytes written per update: {sum(map(written_bytes, slots))} -> {written_bytes(board_sensor)}")
+
+
+def compare_memory() -> None:
+    responses = [[departure(i) for i in range(RESPONSE_DEPARTURES)] for _ in range(RESPONSES)]
+    count = RESPONSES * RESPONSE_DEPARTURES
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    columns = [DepartureColumns.from_api(response) for response in responses]
+    after_columns = tracemalloc.get_traced_memory()[0]
+    objects = [[DepartureData.from_api(dep) for dep in response] for response in responses]
+    after_objects = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"bytes per departure: columnar {(after_columns - before) / count:.0f}, "
+          f"objects {(after_objects - after_columns) / count:.0f}")
+    del columns, objects
+
+
+def main() -> None:
+    asyncio.run(compare_entities())
+    compare_memory()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Synthetic load for measuring event loop stalls caused by parsing departure board responses.
+
+500 boards refresh spread over 5 s (10-departure responses), every hundredth of them also refreshes its
+calendar timeline (a 1000-departure response). The event loop is sampled every 10 ms by the integration's
+LoopMonitor, once with all responses parsed in the event loop and once with the size-aware policy
+(responses larger than PARSE_INLINE_MAX_BYTES are parsed in an executor).
+
+Run from the repository root with Home Assistant installed:
+
+    python scripts/loop_stall_load.py
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+import json
+from pathlib import Path
+import sys
+import time
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from custom_components.pid_departures import dep_board_api  # noqa: E402
+from custom_components.pid_departures.columnar import decode_departures  # noqa: E402
+from custom_components.pid_departures.const import PARSE_INLINE_MAX_BYTES  # noqa: E402
+from custom_components.pid_departures.loopmonitor import LoopMonitor  # noqa: E402
+
+BOARDS = 500
+SPREAD = 5.0
+SAMPLE_INTERVAL = 0.01
+NOW = datetime.now(ZoneInfo("Europe/Prague")).replace(microsecond=0)
+
+
+def departure(num: int) -> dict:
+    time = (NOW + timedelta(minutes=num)).isoformat()
+    return {
+        "arrival_timestamp": {"predicted": time, "scheduled": time},
+        "departure_timestamp": {"predicted": time, "scheduled": time, "minutes": str(num)},
+        "delay": {"is_available": True, "minutes": 0, "seconds": 30},
+        "route": {
+            "short_name": "22", "type": 0, "is_night": False, "is_regional": False, "is_substitute_transport": False
+        },
+        "trip": {
+            "short_name": None, "id": f"22_{num}", "direction": None, "headsign": "Bílá Hora",
+            "is_air_conditioned": True, "is_at_stop": False, "is_canceled": False, "is_wheelchair_accessible": True,
+        },
+        "last_stop": {"id": None, "name": None},
+        "stop": {"id": "U1Z1P", "platform_code": "A"},
+    }
+
+
+def response(count: int) -> bytes:
+    return json.dumps({"stops": [], "infotexts": [], "departures": [departure(i) for i in range(count)]}).encode()
+
+
+async def run(inline_max: int, small: bytes, large: bytes) -> None:
+    dep_board_api.PARSE_INLINE_MAX_BYTES = inline_max
+    monitor = LoopMonitor(SimpleNamespace(loop=asyncio.get_running_loop()))  # type: ignore[arg-type]
+    monitor._interval = SAMPLE_INTERVAL
+    monitor.start()
+
+    async def board(num: int) -> None:
+        await asyncio.sleep(num * SPREAD / BOARDS)
+        await dep_board_api.async_parse_response(small, decode_departures)
+        if num % 100 == 0:
+            await dep_board_api.async_parse_response(large, decode_departures)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(board(num) for num in range(BOARDS)))
+    monitor.stop()
+    policy = "all responses" if inline_max == sys.maxsize else f"responses up to {inline_max} B"
+    print(f"{policy} parsed in the event loop: {time.perf_counter() - start:.2f} s, {monitor.stats()}")
+
+
+def main() -> None:
+    small, large = response(10), response(1000)
+    print(f"response sizes: {len(small)} B, {len(large)} B")
+    asyncio.run(run(sys.maxsize, small, large))
+    asyncio.run(run(PARSE_INLINE_MAX_BYTES, small, large))
+
+
+if __name__ == "__main__":
+    main()